@@ -0,0 +1,60 @@
+"""
+Gunicorn configuration to serve musician in production.
+
+Every value can be overridden by environment variables (or the `.env`
+file). Views spend most of their time waiting for the Orchestra API, so
+every worker process runs several threads.
+
+Module level names are read by gunicorn as settings, so only settings
+are defined here (`decouple` is not imported as `config`).
+
+Send SIGHUP to the master process to gracefully restart the workers. As
+the application is preloaded by the master, deploy new code by sending
+SIGUSR2 (a new master is started) and then SIGQUIT to the old master.
+"""
+import multiprocessing
+
+import decouple
+
+
+bind = decouple.config('GUNICORN_BIND', default='0.0.0.0:8080')
+
+workers = decouple.config('GUNICORN_WORKERS', default=multiprocessing.cpu_count() * 2 + 1, cast=int)
+
+# `gthread` or `gevent`: a gevent worker serves many concurrent requests
+# waiting for the Orchestra API (up to `worker_connections`)
+worker_class = decouple.config('GUNICORN_WORKER_CLASS', default='gthread')
+
+threads = decouple.config('GUNICORN_THREADS', default=4, cast=int)
+
+worker_connections = decouple.config('GUNICORN_WORKER_CONNECTIONS', default=100, cast=int)
+
+if worker_class == 'gevent':
+    # patch before the application is preloaded by the master process
+    from gevent import monkey
+    monkey.patch_all()
+
+# load the application before forking the workers: they start faster
+# and share the memory of the loaded code
+preload_app = decouple.config('GUNICORN_PRELOAD', default=True, cast=bool)
+
+timeout = decouple.config('GUNICORN_TIMEOUT', default=30, cast=int)
+
+graceful_timeout = decouple.config('GUNICORN_GRACEFUL_TIMEOUT', default=30, cast=int)
+
+keepalive = decouple.config('GUNICORN_KEEPALIVE', default=5, cast=int)
+
+# restart workers periodically to bound memory growth
+max_requests = decouple.config('GUNICORN_MAX_REQUESTS', default=1000, cast=int)
+
+max_requests_jitter = decouple.config('GUNICORN_MAX_REQUESTS_JITTER', default=100, cast=int)
+
+accesslog = decouple.config('GUNICORN_ACCESSLOG', default='-')
+
+wsgi_app = 'userpanel.wsgi:application'
+
+
+def post_fork(server, worker):
+    # connections must not be shared with the master process
+    from django.db import connections
+    connections.close_all()
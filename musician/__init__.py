@@ -4,6 +4,8 @@ Package metadata definition.
 
 VERSION = (0, 2, 0, 'final', 0)
 
+default_app_config = 'musician.apps.MusicianConfig'
+
 
 def get_version():
     "Returns a PEP 386-compliant version number from VERSION."
@@ -1,13 +1,33 @@
+import contextvars
+import logging
+import random
+import re
+import threading
+import time
 import urllib.parse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-import requests
 from django.conf import settings
 from django.http import Http404
 from django.urls.exceptions import NoReverseMatch
 from django.utils.translation import gettext_lazy as _
-
+from requests.exceptions import HTTPError, RequestException
+
+from . import settings as musician_settings
+from .breaker import get_breaker
+from .cache import (get_cache, invalidate_resources, make_resource_key, make_token_key, make_unpaginated_key,
+                    make_url_key)
+from .metrics import record_api_call
+from .session import get_session
+from .snapshots import forget_dashboard_snapshot
+from .usage import forget_account_usage
 from .models import Address, DatabaseService, Domain, Mailbox, SaasService, UserAccount, WebSite
 
+
+logger = logging.getLogger(__name__)
+
 DOMAINS_PATH = 'domains/'
 TOKEN_PATH = '/api-token-auth/'
 
@@ -35,14 +55,32 @@ API_PATHS = {
     'payment-source-list': 'payment-sources/',
 }
 
+# requests that can be safely retried and the responses that are retried
+IDEMPOTENT_VERBS = ('HEAD', 'GET', 'PUT', 'DELETE')
+RETRY_STATUSES = (502, 503, 504)
+
+# regular expressions to resolve the path name of an URL
+API_PATTERNS = [
+    (path_name, re.compile(re.escape(path).replace(re.escape('{pk}'), '[^/]+')))
+    for path_name, path in API_PATHS.items()
+]
+
 
 class Orchestra(object):
     def __init__(self, *args, username=None, password=None, **kwargs):
         self.base_url = kwargs.pop('base_url', settings.API_BASE_URL)
         self.username = username
-        self.session = requests.Session()
+        self.session = get_session()
         self.auth_token = kwargs.pop("auth_token", None)
 
+        # instances live during a single request: identical GET requests
+        # are only sent once (see `request`)
+        self.responses = {}
+        self.stats = {'requests': 0, 'memoized': 0}
+        # URLs whose payload has been served stale (see `send`)
+        self.stale_urls = set()
+        self._lock = threading.Lock()
+
         if self.auth_token is None:
             self.auth_token = self.authenticate(self.username, password)
 
@@ -54,17 +92,26 @@ class Orchestra(object):
 
         return urllib.parse.urljoin(self.base_url, path)
 
+    def resolve_path_name(self, url):
+        """Return the name of the API path (see API_PATHS) of an URL."""
+        path = url.split('?')[0]
+        if path.startswith(self.base_url):
+            path = path[len(self.base_url):]
+        else:
+            path = urllib.parse.urlparse(path).path
+
+        for path_name, pattern in API_PATTERNS:
+            if pattern.fullmatch(path):
+                return path_name
+        return 'unknown'
+
     def authenticate(self, username, password):
         url = self.build_absolute_uri('token-auth')
-        response = self.session.post(
-            url,
-            data={"username": username, "password": password},
-        )
+        response = self.perform("POST", url, data={"username": username, "password": password})
 
         return response.json().get("token", None)
 
-    def request(self, verb, resource=None, url=None, data=None, render_as="json", querystring=None, raise_exception=True):
-        assert verb in ["HEAD", "GET", "POST", "PATCH", "PUT", "DELETE"]
+    def build_url(self, resource=None, url=None, querystring=None):
         if resource is not None:
             url = self.build_absolute_uri(resource)
         elif url is None:
@@ -72,35 +119,241 @@ class Orchestra(object):
 
         if querystring is not None:
             url = "{}?{}".format(url, querystring)
+        return url
+
+    def request(self, verb, resource=None, url=None, data=None, render_as="json", querystring=None,
+                raise_exception=True, timeout=None):
+        assert verb in ["HEAD", "GET", "POST", "PATCH", "PUT", "DELETE"]
+        url = self.build_url(resource, url, querystring)
+
+        memoize = verb == "GET" and render_as != "stream"
+        key = (url, render_as)
+        with self._lock:
+            if memoize and key in self.responses:
+                self.stats['memoized'] += 1
+                return self.responses[key]
+            if verb not in ["HEAD", "GET"]:
+                # a write operation may change any of the retrieved resources
+                self.responses.clear()
+
+        status, output = self.send(
+            verb, url, data=data, render_as=render_as, raise_exception=raise_exception, timeout=timeout)
 
-        verb = getattr(self.session, verb.lower())
+        # errors are not memoized: callers may expect an exception
+        if memoize and 200 <= status < 300:
+            self.responses[key] = (status, output)
+
+        return status, output
+
+    def send(self, verb, url, data=None, render_as="json", raise_exception=True, timeout=None):
+        """Perform a request to the API (see `request`)."""
+        with self._lock:
+            self.stats['requests'] += 1
         headers = {
             "Authorization": "Token {}".format(self.auth_token),
             "Content-Type": "application/json",
         }
-        response = verb(url, json=data, headers=headers, allow_redirects=False)
+
+        # conditional request: reuse the last payload if it has not changed
+        validators_key = None
+        validated = None
+        if verb == "GET" and render_as == "json" and self.auth_token is not None:
+            validators_key = make_url_key(self.auth_token, 'validators', url)
+            validated = get_cache().get(validators_key)
+            if validated is not None:
+                headers.update(validated['headers'])
+
+        try:
+            response = self.perform(
+                verb, url, json=data, headers=headers, allow_redirects=False,
+                stream=render_as == "stream", timeout=timeout,
+            )
+        except RequestException:
+            if not self.can_serve_stale(validated):
+                raise
+            # the API is unavailable: serve the last payload retrieved
+            logger.warning("Serving stale response of %s", self.resolve_path_name(url), exc_info=True)
+            return self.serve_stale(url, validated)
+
+        if validated is not None and response.status_code == 304:
+            # the payload is fresh again (see `can_serve_stale`)
+            validated['stored_at'] = time.time()
+            get_cache().set(validators_key, validated, musician_settings.API_VALIDATORS_TTL)
+            return validated['status'], validated['output']
+
+        if response.status_code >= 500 and self.can_serve_stale(validated):
+            logger.warning("Serving stale response of %s (status %s)",
+                           self.resolve_path_name(url), response.status_code)
+            return self.serve_stale(url, validated)
 
         if raise_exception:
             response.raise_for_status()
 
         status = response.status_code
-        if status < 500 and render_as == "json":
+        if render_as == "stream":
+            # the caller should consume and close the response
+            output = response
+        elif status < 500 and render_as == "json":
             output = response.json()
         else:
             output = response.content
 
+        if validators_key is not None and status == 200:
+            self.store_validators(validators_key, response, output)
+
         return status, output
 
-    def retrieve_service_list(self, service_name, querystring=None):
+    def perform(self, verb, url, timeout=None, **kwargs):
+        """
+        Send an HTTP request to the API through the circuit breaker.
+
+        Idempotent requests are retried (see API_RETRIES) on connection
+        errors, timeouts and 502, 503 or 504 responses.
+        """
+        breaker = get_breaker(self.base_url)
+        path_name = self.resolve_path_name(url)
+        method = getattr(self.session, verb.lower())
+        if timeout is None:
+            timeout = (musician_settings.API_CONNECT_TIMEOUT, musician_settings.API_READ_TIMEOUT)
+        retries = musician_settings.API_RETRIES if verb in IDEMPOTENT_VERBS else 0
+
+        for attempt in range(retries + 1):
+            if attempt:
+                backoff = musician_settings.API_RETRY_BACKOFF * 2 ** (attempt - 1)
+                time.sleep(backoff * random.uniform(0.5, 1.5))
+
+            breaker.before_request()
+            start = time.monotonic()
+            try:
+                response = method(url, timeout=timeout, **kwargs)
+                if kwargs.get('stream'):
+                    size = int(response.headers.get('Content-Length', 0))
+                else:
+                    size = len(response.content)
+            except RequestException:
+                record_api_call(path_name, None, time.monotonic() - start, 0)
+                breaker.record_failure()
+                if attempt == retries:
+                    raise
+                logger.info("Retrying %s %s", verb, path_name, exc_info=True)
+                continue
+
+            record_api_call(path_name, response.status_code, time.monotonic() - start, size)
+            if response.status_code < 500:
+                breaker.record_success()
+                return response
+
+            breaker.record_failure()
+            if attempt == retries or response.status_code not in RETRY_STATUSES:
+                return response
+            response.close()
+            logger.info("Retrying %s %s (status %s)", verb, path_name, response.status_code)
+
+    def store_validators(self, key, response, output):
+        """
+        Keep the validators (ETag, Last-Modified) of a response and its
+        payload (nothing is kept if the response has no validators).
+        """
+        headers = {}
+        if 'ETag' in response.headers:
+            headers['If-None-Match'] = response.headers['ETag']
+        if 'Last-Modified' in response.headers:
+            headers['If-Modified-Since'] = response.headers['Last-Modified']
+        if not headers:
+            return
+
+        get_cache().set(key, {
+            'headers': headers,
+            'status': response.status_code,
+            'output': output,
+            'stored_at': time.time(),
+        }, musician_settings.API_VALIDATORS_TTL)
+
+    def can_serve_stale(self, validated):
+        """
+        Check if the stored payload can be served when the API is
+        unavailable (up to API_STALE_IF_ERROR_TTL after it was retrieved).
+        """
+        if validated is None:
+            return False
+        return time.time() - validated.get('stored_at', 0) <= musician_settings.API_STALE_IF_ERROR_TTL
+
+    def serve_stale(self, url, validated):
+        with self._lock:
+            self.stale_urls.add(url)
+        return validated['status'], validated['output']
+
+    def is_stale(self, resource, querystring=None):
+        """Check if the payload of a resource has been served stale."""
+        return self.build_url(resource, querystring=querystring) in self.stale_urls
+
+    def gather(self, **calls):
+        """
+        Resolve independent API calls concurrently.
+
+        Each keyword argument is a callable without arguments (e.g. a bound
+        method or a `functools.partial`). Returns a dict with the result of
+        every call keyed by the same name. If any call raises an exception
+        it is propagated to the caller.
+        """
+        if len(calls) < 2:
+            return {name: call() for name, call in calls.items()}
+
+        max_workers = min(len(calls), musician_settings.API_MAX_WORKERS)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # run each call on a copy of the context to keep request metrics
+            futures = {
+                name: executor.submit(contextvars.copy_context().run, call)
+                for name, call in calls.items()
+            }
+            return {name: future.result() for name, future in futures.items()}
+
+    def retrieve_service_list(self, service_name, querystring=None, page=None, per_page=None, use_cache=True):
+        """
+        Return the JSON rows of a list of services (cached during
+        API_CACHE_TTL). If `use_cache` is False the list is retrieved from
+        the API (and the cached one is replaced by it).
+        """
         pattern_name = '{}-list'.format(service_name)
         if pattern_name not in API_PATHS:
             raise ValueError("Unknown service {}".format(service_name))
-        _, output = self.request("GET", pattern_name, querystring=querystring)
+
+        cache = get_cache()
+        list_querystring = querystring
+        # ask the backend for a single page unless it's known that it
+        # doesn't paginate the service (the whole list is shared then)
+        paginate = page is not None and not cache.get(make_unpaginated_key(service_name))
+        if paginate:
+            pagination = urllib.parse.urlencode({'page': page, 'per_page': per_page})
+            querystring = '&'.join(filter(None, [querystring, pagination]))
+
+        timeout = musician_settings.API_CACHE_TTL.get(service_name)
+        cache_key = make_resource_key(self.auth_token, service_name, querystring)
+        output = cache.get(cache_key) if use_cache and timeout else None
+        if output is None:
+            _, output = self.request("GET", pattern_name, querystring=querystring)
+            if paginate and isinstance(output, list):
+                # pagination has been ignored: don't request pages anymore
+                cache.set(make_unpaginated_key(service_name), True, musician_settings.API_UNPAGINATED_TTL)
+                cache_key = make_resource_key(self.auth_token, service_name, list_querystring)
+            # a stale payload would outlive API_STALE_IF_ERROR_TTL if cached
+            if timeout and not self.is_stale(pattern_name, querystring):
+                cache.set(cache_key, output, timeout)
         return output
 
+    def retrieve_lazy_service_list(self, service_class, querystring=None, page=1, per_page=None, ordering=None):
+        return LazyServiceList(
+            self, service_class, querystring=querystring, page=page, per_page=per_page, ordering=ordering)
+
+    def invalidate_cache(self, *service_names):
+        """Discard cached lists of services modified by a write operation."""
+        invalidate_resources(self.auth_token, *service_names)
+        forget_dashboard_snapshot(self.auth_token)
+        forget_account_usage(self.auth_token)
+
     def retrieve_profile(self):
-        status, output = self.request("GET", 'my-account')
-        if status >= 400:
+        output = self.verify_credentials()
+        if output is None:
             raise PermissionError("Cannot retrieve profile of an anonymous user.")
         return UserAccount.new_from_json(output[0])
 
@@ -113,9 +366,27 @@ class Orchestra(object):
             raise Http404(_("No domain found matching the query"))
         return bill_pdf
 
+    def stream_bill_document(self, pk):
+        """
+        Retrieve the document of a bill without loading it into memory.
+
+        Returns the API response: its content should be consumed with
+        `iter_content` and the response closed when done.
+        """
+        path = API_PATHS.get('bill-document').format_map({'pk': pk})
+
+        url = urllib.parse.urljoin(self.base_url, path)
+        status, response = self.request("GET", render_as="stream", url=url, raise_exception=False)
+        if status == 404:
+            response.close()
+            raise Http404(_("No domain found matching the query"))
+        return response
+
     def create_mail_address(self, data):
         resource = '{}-list'.format(Address.api_name)
-        return self.request("POST", resource=resource, data=data)
+        response = self.request("POST", resource=resource, data=data)
+        self.invalidate_cache(Address.api_name, Mailbox.api_name)
+        return response
 
     def retrieve_mail_address(self, pk):
         path = API_PATHS.get('address-detail').format_map({'pk': pk})
@@ -129,7 +400,9 @@ class Orchestra(object):
     def update_mail_address(self, pk, data):
         path = API_PATHS.get('address-detail').format_map({'pk': pk})
         url = urllib.parse.urljoin(self.base_url, path)
-        return self.request("PUT", url=url, data=data)
+        response = self.request("PUT", url=url, data=data)
+        self.invalidate_cache(Address.api_name, Mailbox.api_name)
+        return response
 
     def retrieve_mail_address_list(self, querystring=None):
         # retrieve mails applying filters (if any)
@@ -138,7 +411,7 @@ class Orchestra(object):
             querystring=querystring,
         )
 
-        addresses = [Address.new_from_json(data) for data in raw_data]
+        addresses = Address.new_list_from_json(raw_data)
 
         # PATCH to include Pangea addresses not shown by orchestra
         # described on issue #4
@@ -160,14 +433,23 @@ class Orchestra(object):
 
         return addresses
 
+    def retrieve_address_choices(self):
+        """Returns (url, full address) pairs of the addresses to populate form fields."""
+        addresses = self.retrieve_service_list(Address.api_name)
+        return [(data['url'], "{}@{}".format(data['name'], data['domain']['name'])) for data in addresses]
+
     def delete_mail_address(self, pk):
         path = API_PATHS.get('address-detail').format_map({'pk': pk})
         url = urllib.parse.urljoin(self.base_url, path)
-        return self.request("DELETE", url=url, render_as=None)
+        response = self.request("DELETE", url=url, render_as=None)
+        self.invalidate_cache(Address.api_name, Mailbox.api_name)
+        return response
 
     def create_mailbox(self, data):
         resource = '{}-list'.format(Mailbox.api_name)
-        return self.request("POST", resource=resource, data=data, raise_exception=False)
+        response = self.request("POST", resource=resource, data=data, raise_exception=False)
+        self.invalidate_cache(Address.api_name, Mailbox.api_name)
+        return response
 
     def retrieve_mailbox(self, pk):
         path = API_PATHS.get('mailbox-detail').format_map({'pk': pk})
@@ -182,18 +464,26 @@ class Orchestra(object):
         path = API_PATHS.get('mailbox-detail').format_map({'pk': pk})
         url = urllib.parse.urljoin(self.base_url, path)
         status, response = self.request("PATCH", url=url, data=data, raise_exception=False)
+        self.invalidate_cache(Address.api_name, Mailbox.api_name)
         return status, response
 
     def retrieve_mailbox_list(self):
         mailboxes = self.retrieve_service_list(Mailbox.api_name)
-        return [Mailbox.new_from_json(mailbox_data) for mailbox_data in mailboxes]
+        return Mailbox.new_list_from_json(mailboxes)
+
+    def retrieve_mailbox_choices(self):
+        """Returns (url, name) pairs of the mailboxes to populate form fields."""
+        mailboxes = self.retrieve_service_list(Mailbox.api_name)
+        return [(data['url'], data['name']) for data in mailboxes]
 
     def delete_mailbox(self, pk):
         path = API_PATHS.get('mailbox-detail').format_map({'pk': pk})
         url = urllib.parse.urljoin(self.base_url, path)
         # Mark as inactive instead of deleting
         # return self.request("DELETE", url=url, render_as=None)
-        return self.request("PATCH", url=url, data={"is_active": False})
+        response = self.request("PATCH", url=url, data={"is_active": False})
+        self.invalidate_cache(Address.api_name, Mailbox.api_name)
+        return response
 
     def set_password_mailbox(self, pk, data):
         path = API_PATHS.get('mailbox-password').format_map({'pk': pk})
@@ -211,21 +501,32 @@ class Orchestra(object):
             raise Http404(_("No domain found matching the query"))
         return Domain.new_from_json(domain_json)
 
-    def retrieve_domain_list(self):
-        output = self.retrieve_service_list(Domain.api_name)
-        websites = self.retrieve_website_list()
+    def retrieve_domain_list(self, use_cache=True):
+        related = self.gather(
+            output=partial(self.retrieve_service_list, Domain.api_name, use_cache=use_cache),
+            websites=partial(self.retrieve_website_list, use_cache=use_cache),
+            addresses=partial(self.retrieve_addresses_by_domain, use_cache=use_cache),
+        )
+        output = related['output']
+        websites = self.index_websites_by_domain(related['websites'])
+        addresses = related['addresses']
 
         domains = []
         for domain_json in output:
-            # filter querystring
-            querystring = "domain={}".format(domain_json['id'])
+            # copy to avoid modifying the retrieved list (it may be reused)
+            domain_json = dict(domain_json)
 
             # retrieve services associated to a domain
-            domain_json['addresses'] = self.retrieve_service_list(
-                Address.api_name, querystring)
+            if addresses is not None:
+                domain_json['addresses'] = addresses.get(domain_json['id'], [])
+            else:
+                # filter querystring
+                querystring = "domain={}".format(domain_json['id'])
+                domain_json['addresses'] = self.retrieve_service_list(
+                    Address.api_name, querystring, use_cache=use_cache)
 
             # retrieve websites (as they cannot be filtered by domain on the API we should do it here)
-            domain_json['websites'] = self.filter_websites_by_domain(websites, domain_json['id'])
+            domain_json['websites'] = websites.get(domain_json['id'], [])
 
             # TODO(@slamora): update when backend provides resource disk usage data
             domain_json['usage'] = {
@@ -240,28 +541,186 @@ class Orchestra(object):
 
         return domains
 
-    def retrieve_website_list(self):
-        output = self.retrieve_service_list(WebSite.api_name)
-        return [WebSite.new_from_json(website_data) for website_data in output]
+    def retrieve_domain_choices(self):
+        """
+        Returns (url, name) pairs of the domains to populate form fields.
+
+        Only the domains are requested (without their addresses and websites).
+        """
+        domains = self.retrieve_service_list(Domain.api_name)
+        return [(data['url'], data['name']) for data in domains]
+
+    def retrieve_addresses_by_domain(self, use_cache=True):
+        """
+        Retrieve all the addresses with a single request and group them
+        by domain id.
+
+        Returns:
+          A dict mapping each domain id to its list of addresses (JSON) or
+          None if the backend doesn't include the domain of some address
+          (callers should fall back to filter addresses by domain).
+        """
+        addresses = self.retrieve_service_list(Address.api_name, use_cache=use_cache)
+
+        addresses_by_domain = defaultdict(list)
+        for address in addresses:
+            domain = address.get('domain') or {}
+            if 'id' not in domain:
+                return None
+            addresses_by_domain[domain['id']].append(address)
+
+        return addresses_by_domain
 
-    def filter_websites_by_domain(self, websites, domain_id):
-        matching = []
+    def retrieve_website_list(self, use_cache=True):
+        output = self.retrieve_service_list(WebSite.api_name, use_cache=use_cache)
+        return WebSite.new_list_from_json(output)
+
+    def index_websites_by_domain(self, websites):
+        """
+        Returns:
+          A dict mapping each domain id to the websites served on it.
+        """
+        index = defaultdict(list)
         for website in websites:
-            web_domains = [web_domain.id for web_domain in website.domains]
-            if domain_id in web_domains:
-                matching.append(website)
+            # read the ids from the JSON: it doesn't build the Domain instances
+            for domain_id in {domain['id'] for domain in website._json['domains']}:
+                index[domain_id].append(website)
 
-        return matching
+        return index
 
     def verify_credentials(self):
         """
         Returns:
           A user profile info if the
           credentials are valid, None otherwise.
+
+        A successful verification is cached (see CREDENTIALS_CACHE_TTL)
+        so the profile can be reused without requesting it again.
         """
+        if self.auth_token is None:
+            return None
+
+        cache = get_cache()
+        cache_key = make_token_key(self.auth_token, 'credentials')
+        output = cache.get(cache_key)
+        if output is not None:
+            return output
+
         status, output = self.request("GET", 'my-account', raise_exception=False)
 
         if status < 400:
+            cache.set(cache_key, output, musician_settings.CREDENTIALS_CACHE_TTL)
             return output
 
         return None
+
+
+class LazyServiceList:
+    """
+    List of services that is retrieved from the API on demand.
+
+    It can be used as the `object_list` of a Django `Paginator`: the page
+    requested is forwarded to the backend and only its rows are converted
+    to `service_class` instances. If the backend doesn't paginate the
+    results the whole collection is retrieved once and sliced locally.
+
+    `page` is the page expected to be rendered: it is the one retrieved to
+    learn the size of the collection. `ordering` (a field, prefixed by `-`
+    for descending order) is forwarded to the backend too, and applied
+    locally if the collection is not paginated.
+    """
+
+    def __init__(self, orchestra, service_class, querystring=None, page=1, per_page=None, ordering=None):
+        self.orchestra = orchestra
+        self.service_class = service_class
+        self.ordering = ordering
+        if ordering:
+            querystring = '&'.join(filter(None, [querystring, urllib.parse.urlencode({'ordering': ordering})]))
+        self.querystring = querystring
+        self.page = page
+        self.per_page = per_page
+        self._count = None
+        self._pages = {}
+        self._rows = None
+
+    def fetch_page(self, number):
+        """Return the raw JSON rows of the page `number` (starting on 1)."""
+        if self._rows is None and number not in self._pages:
+            try:
+                output = self.orchestra.retrieve_service_list(
+                    self.service_class.api_name,
+                    querystring=self.querystring,
+                    page=number,
+                    per_page=self.per_page,
+                )
+            except HTTPError as error:
+                # a paginated backend answers 404 to pages out of range
+                if number == 1 or error.response is None or error.response.status_code != 404:
+                    raise
+                self._pages[number] = []
+                return []
+
+            if isinstance(output, dict) and 'results' in output:
+                self._count = output['count']
+                self._pages[number] = output['results']
+            else:
+                self._rows = self.sort(output)
+                self._count = len(output)
+
+        if self._rows is not None:
+            bottom = (number - 1) * self.per_page
+            return self._rows[bottom:bottom + self.per_page]
+
+        return self._pages[number]
+
+    def sort(self, rows):
+        """Apply the ordering to the rows (the backend may ignore it)."""
+        if not self.ordering:
+            return rows
+        field = self.ordering.lstrip('-')
+        return sorted(rows, key=lambda row: str(row.get(field, '')), reverse=self.ordering.startswith('-'))
+
+    def fetch_all(self):
+        """Return the raw JSON rows of the whole collection."""
+        if self._rows is None:
+            number = 1
+            rows = self.fetch_page(number)
+            while self._rows is None and len(rows) < self._count:
+                number += 1
+                page = self.fetch_page(number)
+                if not page:
+                    break
+                rows = rows + page
+            if self._rows is None:
+                self._rows = rows
+
+        return self._rows
+
+    def count(self):
+        if self._count is None:
+            self.fetch_page(self.page)
+        if self._count is None:
+            # the page is out of range: learn the size from the first one
+            self.fetch_page(1)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            if key < 0:
+                key += self.count()
+            return self[key:key + 1][0]
+
+        start = key.start or 0
+        stop = self.count() if key.stop is None else key.stop
+        if self.per_page and start % self.per_page == 0 and stop - start <= self.per_page:
+            rows = self.fetch_page(start // self.per_page + 1)[:stop - start]
+        else:
+            rows = self.fetch_all()[start:stop]
+
+        return self.service_class.new_list_from_json(rows)
+
+    def __iter__(self):
+        return iter(self.service_class.new_list_from_json(self.fetch_all()))
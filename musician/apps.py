@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class MusicianConfig(AppConfig):
     name = 'musician'
+
+    def ready(self):
+        from .cache import check_shared_cache
+        checks.register(check_shared_cache, 'caches')
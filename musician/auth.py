@@ -1,6 +1,10 @@
 from django.middleware.csrf import rotate_token
 from django.utils.crypto import constant_time_compare
 
+from .cache import forget_token
+from .snapshots import forget_dashboard_snapshot
+from .usage import forget_account_usage
+
 SESSION_KEY_TOKEN = '_auth_token'
 SESSION_KEY_USERNAME = '_auth_username'
 
@@ -32,6 +36,12 @@ def logout(request):
     Remove the authenticated user's ID from the request and flush their session
     data.
     """
+    token = request.session.get(SESSION_KEY_TOKEN)
+    if token is not None:
+        forget_token(token)
+        forget_dashboard_snapshot(token)
+        forget_account_usage(token)
+
     request.session.flush()
     # if hasattr(request, 'user'):
     #     from django.contrib.auth.models import AnonymousUser
@@ -0,0 +1,107 @@
+"""
+Circuit breaker of the requests to the Orchestra API.
+
+When the error rate of the requests of the last API_BREAKER_WINDOW seconds
+reaches API_BREAKER_THRESHOLD the circuit opens: requests fail immediately
+(instead of waiting for timeouts of an unavailable backend) during
+API_BREAKER_COOLDOWN seconds. Then a single trial request is allowed: if it
+succeeds the circuit is closed again, otherwise it's kept open.
+
+The state is kept by process (every worker learns on its own).
+"""
+import collections
+import logging
+import threading
+import time
+
+from requests.exceptions import RequestException
+
+from . import settings as musician_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RequestException):
+    """The request has not been sent because the circuit is open."""
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, threshold, min_calls, window, cooldown):
+        self.name = name
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.results = collections.deque()
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """Raise CircuitOpenError if the request should not be sent."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            now = time.monotonic()
+            if now - self.opened_at >= self.cooldown:
+                # let a single request check if the backend has recovered
+                self.state = self.HALF_OPEN
+                self.opened_at = now
+                return
+
+        raise CircuitOpenError("Circuit of {} is {}".format(self.name, self.state))
+
+    def record_success(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                logger.info("Circuit of %s closed", self.name)
+                self.state = self.CLOSED
+            self.add_result(True)
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.open()
+                return
+
+            self.add_result(False)
+            failures = sum(1 for _, ok in self.results if not ok)
+            if (self.state == self.CLOSED and len(self.results) >= self.min_calls
+                    and failures >= self.threshold * len(self.results)):
+                self.open()
+
+    def add_result(self, ok):
+        now = time.monotonic()
+        self.results.append((now, ok))
+        while now - self.results[0][0] > self.window:
+            self.results.popleft()
+
+    def open(self):
+        logger.warning("Circuit of %s opened", self.name)
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.results.clear()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Return the circuit breaker of the API served on `name` (base URL)."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name,
+                threshold=musician_settings.API_BREAKER_THRESHOLD,
+                min_calls=musician_settings.API_BREAKER_MIN_CALLS,
+                window=musician_settings.API_BREAKER_WINDOW,
+                cooldown=musician_settings.API_BREAKER_COOLDOWN,
+            )
+        return _breakers[name]
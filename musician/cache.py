@@ -0,0 +1,93 @@
+"""
+Helpers to cache data retrieved from the Orchestra API.
+
+Cached data belongs to the account that owns the API token, so keys are
+always scoped by a hash of the token (the token itself is never stored).
+"""
+import hashlib
+
+from django.core import checks
+from django.core.cache import caches
+from django.utils.translation import get_language
+
+from . import settings as musician_settings
+
+
+def get_cache():
+    return caches[musician_settings.CACHE_ALIAS]
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """Warn if the cache is not shared by the worker processes."""
+    backend = get_cache()
+    if type(backend).__name__ == 'LocMemCache':
+        return [checks.Warning(
+            "The cache of musician is local to each process",
+            hint="Configure a shared backend (e.g. file based or memcached): data discarded "
+                 "by a write operation is still served by the other workers.",
+            id='musician.W001',
+        )]
+    return []
+
+
+def make_token_key(token, *parts):
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    return ':'.join(['musician', token_hash] + [str(part) for part in parts])
+
+
+def make_url_key(token, prefix, url):
+    """Build a key for data related to an URL (hashed to keep keys short)."""
+    return make_token_key(token, prefix, hashlib.sha256(url.encode()).hexdigest())
+
+
+def make_resource_key(token, resource, querystring=None):
+    """Build the key of a resource list taking into account its version."""
+    version = get_cache().get(make_token_key(token, resource, 'version'), 0)
+    return make_token_key(token, resource, version, querystring or '')
+
+
+def make_unpaginated_key(resource):
+    """Build the key marking a resource as not paginated by the API (shared by all the accounts)."""
+    return ':'.join(['musician', 'unpaginated', resource])
+
+
+def invalidate_resources(token, *resources):
+    """
+    Invalidate every cached list (whatever the querystring) of the resources
+    by increasing its version.
+    """
+    cache = get_cache()
+    for resource in resources:
+        key = make_token_key(token, resource, 'version')
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def forget_token(token):
+    """Invalidate cached credentials verification of a token (e.g. on logout)."""
+    get_cache().delete(make_token_key(token, 'credentials'))
+
+
+def make_fragment_key(name, *parts):
+    """Build the key of a rendered template fragment (shared by all the accounts)."""
+    digest = hashlib.sha256(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return ':'.join(['musician', 'fragment', name, digest])
+
+
+def make_object_fragment_key(name, obj):
+    """Build the key of a fragment that only depends on an Orchestra object (and the active language)."""
+    return make_fragment_key(name, obj.id, obj.cache_version, get_language())
+
+
+def get_cached_fragments(name, objects):
+    """
+    Retrieve the cached fragments of a list of objects in a single round
+    (see the `cache_fragment` template tag).
+
+    Returns:
+      A dict mapping the key of each fragment found to its HTML.
+    """
+    keys = [make_object_fragment_key(name, obj) for obj in objects]
+    return get_cache().get_many(keys)
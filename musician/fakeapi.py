@@ -0,0 +1,337 @@
+"""
+Fake Orchestra API served locally.
+
+It generates an account with a configurable number of services and serves
+it like the Orchestra API does, so musician can be tested and benchmarked
+without a real backend. Any credentials are accepted.
+"""
+import json
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_SIZES = {
+    'domains': 5,
+    'websites': 5,
+    'addresses': 20,
+    'mailboxes': 10,
+    'bills': 12,
+    'databases': 2,
+    'saas': 2,
+    'lists': 2,
+}
+
+TOKEN = 'fake-orchestra-token'
+
+# minimal PDF served as the document of every bill
+BILL_DOCUMENT = b'%PDF-1.4\n' + b'0' * 32 * 1024 + b'\n%%EOF\n'
+
+
+def disk_resource(used, allocated):
+    return {'name': 'disk', 'used': str(used), 'allocated': str(allocated), 'unit': 'GiB'}
+
+
+def generate_account(base_url, sizes=None):
+    """
+    Returns:
+      A dict mapping every API path (relative to `base_url`) to the list
+      of objects of the generated account.
+    """
+    sizes = dict(DEFAULT_SIZES, **(sizes or {}))
+
+    def url(path, pk):
+        return urllib.parse.urljoin(base_url, '{}{}/'.format(path, pk))
+
+    domains = [{
+        'id': pk,
+        'url': url('domains/', pk),
+        'name': 'domain{}.example.org'.format(pk),
+        'records': [{'type': 'A', 'value': '192.0.2.{}'.format(pk % 256)}],
+        'resources': [disk_resource(pk % 10, 10)],
+    } for pk in range(1, sizes['domains'] + 1)]
+
+    def domain_ref(index):
+        domain = domains[index % len(domains)]
+        return {key: domain[key] for key in ['id', 'url', 'name']}
+
+    mailboxes = [{
+        'id': pk,
+        'url': url('mailboxes/', pk),
+        'name': 'mailbox{}'.format(pk),
+        'filtering': 'DISABLE',
+        'is_active': True,
+        'addresses': [],
+        'resources': [disk_resource(pk % 2, 2)],
+    } for pk in range(1, sizes['mailboxes'] + 1)]
+
+    addresses = []
+    for pk in range(1, sizes['addresses'] + 1):
+        name = 'user{}'.format(pk)
+        address = {
+            'id': pk,
+            'url': url('addresses/', pk),
+            'name': name,
+            'names': [name],
+            'domain': domain_ref(pk) if domains else None,
+            'mailboxes': [],
+            'forward': '',
+        }
+        if mailboxes and pk % 2:
+            mailbox = mailboxes[pk % len(mailboxes)]
+            address['mailboxes'].append({
+                key: mailbox[key] for key in ['id', 'url', 'name', 'resources']
+            })
+            mailbox['addresses'].append({
+                key: address[key] for key in ['id', 'url', 'name', 'domain', 'forward']
+            })
+        else:
+            address['forward'] = '{}@example.net'.format(name)
+        addresses.append(address)
+
+    websites = [{
+        'id': pk,
+        'url': url('websites/', pk),
+        'name': 'web{}'.format(pk),
+        'protocol': 'https',
+        'is_active': True,
+        'domains': [domain_ref(pk)] if domains else [],
+        'contents': [{'path': '/', 'webapp': {'type': 'php'}}],
+    } for pk in range(1, sizes['websites'] + 1)]
+
+    bills = [{
+        'id': pk,
+        'url': url('bills/', pk),
+        'number': 'F{:06d}'.format(pk),
+        'type': 'INVOICE',
+        'total': '{:.2f}'.format(pk * 10),
+        'is_sent': True,
+        'created_on': '2020-01-{:02d}'.format(pk % 28 + 1),
+        'due_on': '2020-02-{:02d}'.format(pk % 28 + 1),
+        'comments': '',
+    } for pk in range(1, sizes['bills'] + 1)]
+
+    databases = [{
+        'id': pk,
+        'url': url('databases/', pk),
+        'name': 'db{}'.format(pk),
+        'type': 'mysql',
+        'users': [{'id': pk, 'url': url('databaseusers/', pk), 'username': 'db{}'.format(pk)}],
+        'resources': [disk_resource(pk, 10)],
+    } for pk in range(1, sizes['databases'] + 1)]
+
+    saas = [{
+        'id': pk,
+        'url': url('saas/', pk),
+        'name': 'saas{}'.format(pk),
+        'service': 'wordpress',
+        'is_active': True,
+        'data': {},
+    } for pk in range(1, sizes['saas'] + 1)]
+
+    lists = [{
+        'id': pk,
+        'url': url('lists/', pk),
+        'name': 'list{}'.format(pk),
+        'is_active': True,
+        'admin_email': 'admin@example.org',
+        'address_name': 'list{}'.format(pk),
+        'address_domain': domain_ref(pk) if domains else None,
+    } for pk in range(1, sizes['lists'] + 1)]
+
+    account = {
+        'id': 1,
+        'username': 'musician',
+        'type': 'INDIVIDUAL',
+        'language': 'EN',
+        'short_name': 'musician',
+        'full_name': 'Fake Musician',
+        'billcontact': {
+            'name': 'Fake Musician',
+            'address': 'Fake street 1',
+            'city': 'Barcelona',
+            'zipcode': '08001',
+            'country': 'ES',
+            'vat': '00000000T',
+        },
+        'last_login': '2020-01-01T00:00:00Z',
+    }
+
+    payment_sources = [{
+        'method': 'SEPADirectDebit',
+        'data': "{'iban': 'ES0000000000000000000000', 'name': 'Fake Musician'}",
+        'is_active': True,
+    }]
+
+    return {
+        'accounts/': [account],
+        'domains/': domains,
+        'websites/': websites,
+        'addresses/': addresses,
+        'mailboxes/': mailboxes,
+        'bills/': bills,
+        'databases/': databases,
+        'saas/': saas,
+        'lists/': lists,
+        'payment-sources/': payment_sources,
+    }
+
+
+class FakeOrchestraHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately: don't delay the body
+    disable_nagle_algorithm = True
+    detail_pattern = re.compile(r'(?P<collection>[\w-]+/)(?P<pk>\d+)/(?P<action>[\w-]+/)?$')
+
+    def do_GET(self):
+        path, query = self.parse_path()
+        if path is None:
+            return self.send_json({'detail': 'Not found.'}, status=404)
+
+        if path in self.server.resources:
+            rows = self.server.resources[path]
+            ordering = query.get('ordering')
+            if ordering:
+                # order like Django REST framework (by a single field)
+                field = ordering.lstrip('-')
+                rows = sorted(rows, key=lambda row: str(row.get(field)), reverse=ordering.startswith('-'))
+            if query.get('page') and query.get('per_page', 'None').isdigit():
+                # paginate like Django REST framework
+                page, per_page = int(query['page']), int(query['per_page'])
+                bottom = (page - 1) * per_page
+                return self.send_json({
+                    'count': len(rows),
+                    'results': rows[bottom:bottom + per_page],
+                })
+            return self.send_json(rows)
+
+        obj, action = self.get_object(path)
+        if obj is None:
+            return self.send_json({'detail': 'Not found.'}, status=404)
+        if path.startswith('bills/') and action == 'document/':
+            return self.send_response_body(BILL_DOCUMENT, 'application/pdf')
+        if action is not None:
+            return self.send_json({'detail': 'Not found.'}, status=404)
+        self.send_json(obj)
+
+    def do_POST(self):
+        is_token_auth = self.path.rstrip('/').endswith('api-token-auth')
+        path, _ = self.parse_path(auth_required=not is_token_auth)
+        body = self.read_body()
+        if is_token_auth:
+            return self.send_json({'token': TOKEN})
+        if path is None:
+            return self.send_json({'detail': 'Not found.'}, status=404)
+        if path in self.server.resources:
+            return self.send_json(body, status=201)
+
+        obj, _ = self.get_object(path)
+        if obj is None:
+            return self.send_json({'detail': 'Not found.'}, status=404)
+        self.send_json({'status': 'ok'})
+
+    def do_PATCH(self):
+        path, _ = self.parse_path()
+        body = self.read_body()
+        obj, _ = self.get_object(path) if path is not None else (None, None)
+        if obj is None:
+            return self.send_json({'detail': 'Not found.'}, status=404)
+        self.send_json(dict(obj, **body))
+
+    do_PUT = do_PATCH
+
+    def do_DELETE(self):
+        path, _ = self.parse_path()
+        obj, _ = self.get_object(path) if path is not None else (None, None)
+        if obj is None:
+            return self.send_json({'detail': 'Not found.'}, status=404)
+        self.send_response_body(b'', 'application/json', status=204)
+
+    def parse_path(self, auth_required=True):
+        """
+        Returns:
+          A tuple (path, query) with the path relative to the API root
+          or None if it's out of the API (or the request isn't authorized).
+        """
+        self.server.count_request()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        parsed = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        if not parsed.path.startswith(self.server.api_path):
+            return None, query
+        if auth_required and self.headers.get('Authorization') != 'Token {}'.format(TOKEN):
+            return None, query
+        return parsed.path[len(self.server.api_path):], query
+
+    def get_object(self, path):
+        match = self.detail_pattern.match(path)
+        if match is None:
+            return None, None
+        for obj in self.server.resources.get(match.group('collection'), []):
+            if str(obj.get('id')) == match.group('pk'):
+                return obj, match.group('action')
+        return None, None
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def send_json(self, payload, status=200):
+        self.send_response_body(json.dumps(payload).encode(), 'application/json', status)
+
+    def send_response_body(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeOrchestraServer(ThreadingHTTPServer):
+    """
+    Serve a generated account (see `generate_account`) on `base_url`.
+
+    `sizes` overrides the number of services of every type (see
+    DEFAULT_SIZES) and every response is delayed `latency` seconds.
+    """
+    daemon_threads = True
+    api_path = '/api/'
+
+    def __init__(self, sizes=None, latency=0, address=('127.0.0.1', 0)):
+        super().__init__(address, FakeOrchestraHandler)
+        self.latency = latency
+        self.base_url = 'http://{}:{}{}'.format(address[0], self.server_port, self.api_path)
+        self.resources = generate_account(self.base_url, sizes)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        """Serve on a background thread until `stop` is called."""
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -36,12 +36,12 @@ class MailForm(forms.Form):
         if self.instance is not None:
             kwargs['initial'] = self.instance.deserialize()
 
-        domains = kwargs.pop('domains')
-        mailboxes = kwargs.pop('mailboxes')
+        domain_choices = kwargs.pop('domain_choices')
+        mailbox_choices = kwargs.pop('mailbox_choices')
 
         super().__init__(*args, **kwargs)
-        self.fields['domain'].choices = [(d.url, d.name) for d in domains]
-        self.fields['mailboxes'].choices = [(m.url, m.name) for m in mailboxes]
+        self.fields['domain'].choices = domain_choices
+        self.fields['mailboxes'].choices = mailbox_choices
 
     def clean(self):
         cleaned_data = super().clean()
@@ -113,9 +113,9 @@ class MailboxCreateForm(forms.Form):
     addresses = forms.MultipleChoiceField(required=False)
 
     def __init__(self, *args, **kwargs):
-        addresses = kwargs.pop('addresses')
+        address_choices = kwargs.pop('address_choices')
         super().__init__(*args, **kwargs)
-        self.fields['addresses'].choices = [(addr.url, addr.full_address_name) for addr in addresses]
+        self.fields['addresses'].choices = address_choices
 
     def clean_password2(self):
         password = self.cleaned_data.get("password")
@@ -145,9 +145,9 @@ class MailboxUpdateForm(forms.Form):
         if self.instance is not None:
             kwargs['initial'] = self.instance.deserialize()
 
-        addresses = kwargs.pop('addresses')
+        address_choices = kwargs.pop('address_choices')
         super().__init__(*args, **kwargs)
-        self.fields['addresses'].choices = [(addr.url, addr.full_address_name) for addr in addresses]
+        self.fields['addresses'].choices = address_choices
 
     def serialize(self):
         assert self.is_valid()
@@ -0,0 +1,187 @@
+import json
+import multiprocessing
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, modify_settings, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from musician import urls
+from musician.cache import get_cache
+from musician.fakeapi import DEFAULT_SIZES, FakeOrchestraServer
+
+
+# views that change the session (or the cached data) instead of rendering a page
+SKIPPED_VIEWS = ('logout', 'profile-set-lang', 'dashboard-refresh')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure latency, Orchestra API calls and memory of every view "
+        "against a local fake Orchestra API."
+    )
+
+    def add_arguments(self, parser):
+        for resource, size in DEFAULT_SIZES.items():
+            parser.add_argument(
+                '--{}'.format(resource), type=int, default=size,
+                help="Number of {} of the fake account (default {}).".format(resource, size),
+            )
+        parser.add_argument(
+            '--latency', type=float, default=0,
+            help="Milliseconds added to every response of the fake API.",
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=10,
+            help="Number of times that every view is requested.",
+        )
+        parser.add_argument(
+            '--view', action='append', dest='views',
+            help="Name of a view to benchmark (can be repeated, all by default).",
+        )
+        parser.add_argument('--output', help="Write the report as JSON to this file.")
+        parser.add_argument('--compare', help="Compare with a report previously written with --output.")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be greater than zero.")
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        sizes = {resource: options[resource] for resource in DEFAULT_SIZES}
+        server = FakeOrchestraServer(sizes=sizes, latency=options['latency'] / 1000)
+
+        # serve the fake API from another process so it doesn't
+        # share the interpreter (and memory usage) with the views
+        process = multiprocessing.get_context('fork').Process(target=server.serve_forever, daemon=True)
+        process.start()
+        try:
+            views = self.run_benchmark(server.base_url, options['views'], options['repeat'])
+        finally:
+            process.terminate()
+            process.join()
+            server.server_close()
+
+        report = {
+            'revision': get_revision(),
+            'python': platform.python_version(),
+            'sizes': sizes,
+            'latency_ms': options['latency'],
+            'repeat': options['repeat'],
+            'views': views,
+        }
+
+        self.print_report(report, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump(report, output_file, indent=2)
+
+    def run_benchmark(self, base_url, names, repeat):
+        setup_test_environment()
+        try:
+            with override_settings(
+                API_BASE_URL=base_url,
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                DEBUG=False,
+            ), modify_settings(MIDDLEWARE={'append': 'musician.middleware.APIMetricsMiddleware'}):
+                client = Client()
+                response = client.post(reverse('musician:login'), {'username': 'musician', 'password': 'musician'})
+                if response.status_code != 302:
+                    raise CommandError("Cannot log in on the fake Orchestra API.")
+
+                return {
+                    name: self.benchmark_view(client, path, repeat)
+                    for name, path in get_view_paths(names)
+                }
+        finally:
+            teardown_test_environment()
+
+    def benchmark_view(self, client, path, repeat):
+        # first request with an empty cache, then `repeat` warm requests
+        get_cache().clear()
+        start = time.perf_counter()
+        response = request(client, path)
+        cold_ms = (time.perf_counter() - start) * 1000
+        cold = response.wsgi_request.api_metrics
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = request(client, path)
+            timings.append((time.perf_counter() - start) * 1000)
+        warm = response.wsgi_request.api_metrics
+
+        tracemalloc.start()
+        try:
+            request(client, path)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'status': response.status_code,
+            'cold_ms': round(cold_ms, 2),
+            'median_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+            'cold_api_calls': len(cold.calls),
+            'cold_api_bytes': cold.total_bytes,
+            'api_calls': len(warm.calls),
+            'api_ms': round(warm.total_ms, 2),
+            'peak_memory_kib': round(peak / 1024, 1),
+        }
+
+    def print_report(self, report, baseline=None):
+        columns = ['cold_ms', 'median_ms', 'p95_ms', 'cold_api_calls', 'api_calls', 'peak_memory_kib']
+        self.stdout.write("{:<20} {:>6} {}".format('view', 'status', ' '.join(
+            '{:>15}'.format(column) for column in columns)))
+
+        for name, result in report['views'].items():
+            previous = (baseline or {}).get('views', {}).get(name)
+            cells = []
+            for column in columns:
+                cell = '{:g}'.format(result[column])
+                if previous and previous.get(column):
+                    change = (result[column] - previous[column]) / previous[column] * 100
+                    cell += ' ({:+.0f}%)'.format(change)
+                cells.append('{:>15}'.format(cell))
+            self.stdout.write("{:<20} {:>6} {}".format(name, result['status'], ' '.join(cells)))
+
+        if baseline is not None:
+            self.stdout.write("Compared with revision {}".format(baseline.get('revision')))
+
+
+def get_view_paths(names=None):
+    """Returns (name, path) of the views to benchmark (objects with pk 1)."""
+    for pattern in urls.urlpatterns:
+        if pattern.name in SKIPPED_VIEWS or (names and pattern.name not in names):
+            continue
+        kwargs = {name: 1 for name in pattern.pattern.converters}
+        yield pattern.name, reverse('musician:' + pattern.name, kwargs=kwargs)
+
+
+def request(client, path):
+    response = client.get(path)
+    if response.streaming:
+        # consume the content to take into account its transfer
+        b''.join(response.streaming_content)
+    return response
+
+
+def get_revision():
+    try:
+        output = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.decode().strip()
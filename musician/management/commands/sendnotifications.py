@@ -0,0 +1,129 @@
+import logging
+import random
+import smtplib
+import time
+from datetime import timedelta
+
+from django.core.mail import get_connection, mail_managers
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from musician import settings as musician_settings
+from musician.models import ManagerNotification
+
+
+logger = logging.getLogger(__name__)
+
+# seconds between purges of sent notifications when running with --loop
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = "Send the queued notifications to the managers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=50,
+            help="Max number of notifications sent using the same connection.",
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep waiting for new notifications instead of exiting when the queue is empty.",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=10,
+            help="Seconds between checks of the queue when running with --loop.",
+        )
+
+    def handle(self, *args, **options):
+        last_purge = None
+        while True:
+            if last_purge is None or time.monotonic() - last_purge >= PURGE_INTERVAL:
+                self.purge_sent()
+                last_purge = time.monotonic()
+
+            sent, failed = self.send_batch(options['batch_size'])
+            if sent or failed:
+                self.stdout.write("Notifications sent: {}, failed: {}".format(sent, failed))
+
+            if not options['loop']:
+                break
+            if sent + failed < options['batch_size']:
+                time.sleep(options['interval'])
+
+    def claim_batch(self, batch_size):
+        """
+        Return the pending notifications claimed by this worker: their next
+        attempt is postponed NOTIFICATION_CLAIM_TTL seconds, so other workers
+        (e.g. cron and --loop) don't send them too.
+        """
+        now = timezone.now()
+        claimed_until = now + timedelta(seconds=musician_settings.NOTIFICATION_CLAIM_TTL)
+        claimed = []
+        with transaction.atomic():
+            pending = ManagerNotification.objects.select_for_update(skip_locked=True).filter(
+                sent_at__isnull=True,
+                attempts__lt=musician_settings.NOTIFICATION_MAX_ATTEMPTS,
+                next_attempt_at__lte=now,
+            )[:batch_size]
+            for notification in pending:
+                # conditional update: backends without row locks may select it twice
+                if ManagerNotification.objects.filter(
+                        pk=notification.pk,
+                        sent_at__isnull=True,
+                        next_attempt_at=notification.next_attempt_at,
+                ).update(next_attempt_at=claimed_until):
+                    notification.next_attempt_at = claimed_until
+                    claimed.append(notification)
+        return claimed
+
+    def purge_sent(self):
+        """Delete notifications sent more than NOTIFICATION_RETENTION_DAYS ago."""
+        sent_before = timezone.now() - timedelta(days=musician_settings.NOTIFICATION_RETENTION_DAYS)
+        deleted, _ = ManagerNotification.objects.filter(sent_at__lt=sent_before).delete()
+        if deleted:
+            self.stdout.write("Sent notifications purged: {}".format(deleted))
+
+    def send_batch(self, batch_size):
+        pending = self.claim_batch(batch_size)
+        if not pending:
+            return 0, 0
+
+        # send the whole batch using the same connection
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except (smtplib.SMTPException, OSError) as e:
+            logger.error("Cannot connect to the mail server", exc_info=True)
+            for notification in pending:
+                self.retry_later(notification, e)
+            return 0, len(pending)
+
+        sent = failed = 0
+        try:
+            for notification in pending:
+                try:
+                    mail_managers(notification.subject, notification.message,
+                                  fail_silently=False, connection=connection)
+                except (smtplib.SMTPException, OSError) as e:
+                    logger.error("Error sending notification %s to managers", notification.pk, exc_info=True)
+                    self.retry_later(notification, e)
+                    failed += 1
+                else:
+                    notification.sent_at = timezone.now()
+                    notification.save(update_fields=['sent_at'])
+                    sent += 1
+        finally:
+            connection.close()
+
+        return sent, failed
+
+    def retry_later(self, notification, error):
+        """Schedule a new attempt using exponential backoff with jitter."""
+        notification.attempts += 1
+        delay = musician_settings.NOTIFICATION_RETRY_DELAY * 2 ** (notification.attempts - 1)
+        delay *= random.uniform(0.5, 1.5)
+        notification.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        notification.last_error = str(error)
+        notification.save(update_fields=['attempts', 'next_attempt_at', 'last_error'])
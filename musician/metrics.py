@@ -0,0 +1,139 @@
+"""
+Metrics of the requests performed to the Orchestra API.
+
+Every API call is recorded on the metrics of the page request being
+processed (see `APIMetricsMiddleware`) and on a process-wide latency
+histogram by API path name (logged every METRICS_REPORT_INTERVAL seconds).
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+from collections import defaultdict
+
+from . import settings as musician_settings
+
+# upper bounds (in milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS = (25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+_current = contextvars.ContextVar('musician_api_metrics', default=None)
+_histograms = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+_histograms_lock = threading.Lock()
+_last_report = time.monotonic()
+
+
+class RequestMetrics:
+    """API calls performed while processing a page request."""
+
+    def __init__(self):
+        self.view_name = None
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def record(self, path_name, status, elapsed, size):
+        with self._lock:
+            self.calls.append({
+                'path_name': path_name,
+                'status': status,
+                'ms': elapsed * 1000,
+                'bytes': size,
+            })
+
+    @property
+    def total_ms(self):
+        return sum(call['ms'] for call in self.calls)
+
+    @property
+    def total_bytes(self):
+        return sum(call['bytes'] for call in self.calls)
+
+    def by_path_name(self):
+        """Aggregate calls by API path name."""
+        summary = {}
+        for call in self.calls:
+            entry = summary.setdefault(call['path_name'], {'calls': 0, 'ms': 0, 'bytes': 0, 'statuses': {}})
+            entry['calls'] += 1
+            entry['ms'] += call['ms']
+            entry['bytes'] += call['bytes']
+            entry['statuses'][call['status']] = entry['statuses'].get(call['status'], 0) + 1
+
+        for entry in summary.values():
+            entry['ms'] = round(entry['ms'], 1)
+        return summary
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'api_calls': len(self.calls),
+            'api_ms': round(self.total_ms, 1),
+            'api_bytes': self.total_bytes,
+            'api_paths': self.by_path_name(),
+        }
+
+    def server_timing(self):
+        """Value of the `Server-Timing` header summarizing the API calls."""
+        timings = ['api;dur={:.1f};desc="{} calls"'.format(self.total_ms, len(self.calls))]
+        for path_name, entry in sorted(self.by_path_name().items()):
+            timings.append('api-{};dur={:.1f};desc="{} calls"'.format(path_name, entry['ms'], entry['calls']))
+        return ', '.join(timings)
+
+
+def start_request_metrics():
+    """Start collecting the API calls of the current request."""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    return metrics, token
+
+
+def stop_request_metrics(token):
+    _current.reset(token)
+
+
+def get_request_metrics():
+    return _current.get()
+
+
+def record_api_call(path_name, status, elapsed, size):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.record(path_name, status, elapsed, size)
+
+    bucket = bisect.bisect_left(LATENCY_BUCKETS, elapsed * 1000)
+    with _histograms_lock:
+        _histograms[path_name][bucket] += 1
+
+
+def get_latency_histograms():
+    """
+    Returns:
+      A dict mapping each API path name to the number of calls of every
+      latency bucket (see LATENCY_BUCKETS) performed by this process.
+    """
+    with _histograms_lock:
+        return {path_name: list(counts) for path_name, counts in _histograms.items()}
+
+
+def get_histograms_report():
+    """
+    Returns:
+      The latency histograms of this process (by bucket upper bound) if
+      METRICS_REPORT_INTERVAL seconds have passed since the last report,
+      None otherwise.
+    """
+    global _last_report
+
+    with _histograms_lock:
+        now = time.monotonic()
+        if now - _last_report < musician_settings.METRICS_REPORT_INTERVAL:
+            return None
+        _last_report = now
+
+    labels = ['{:g}'.format(bound) for bound in LATENCY_BUCKETS[:-1]] + ['+Inf']
+    return {
+        'pid': os.getpid(),
+        'latency_ms': {
+            path_name: dict(zip(labels, counts))
+            for path_name, counts in get_latency_histograms().items()
+        },
+    }
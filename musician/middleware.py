@@ -0,0 +1,114 @@
+import json
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.http import JsonResponse
+
+from . import settings as musician_settings
+from .cache import get_cache
+from .metrics import get_histograms_report, get_request_metrics, start_request_metrics, stop_request_metrics
+from .session import get_pool_stats
+
+
+logger = logging.getLogger(__name__)
+
+metrics_logger = logging.getLogger('musician.metrics')
+
+
+class HealthCheckMiddleware:
+    """
+    Answer liveness (HEALTH_CHECK_PATH) and readiness (READINESS_CHECK_PATH)
+    checks of the load balancer or container orchestrator.
+
+    It must be the first middleware: checks are answered before validating
+    the host (probes use the IP of the server) and they never request the
+    Orchestra API, so its unavailability doesn't restart the workers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path == musician_settings.HEALTH_CHECK_PATH:
+            return JsonResponse({'status': 'ok'})
+
+        if request.path == musician_settings.READINESS_CHECK_PATH:
+            checks = {'database': self.check_database(), 'cache': self.check_cache()}
+            ready = all(checks.values())
+            return JsonResponse(
+                {'status': 'ok' if ready else 'unavailable', 'checks': checks},
+                status=200 if ready else 503,
+            )
+
+        return self.get_response(request)
+
+    def check_database(self):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except DatabaseError:
+            logger.exception("Readiness check: database unavailable")
+            return False
+        return True
+
+    def check_cache(self):
+        cache = get_cache()
+        try:
+            cache.set('musician:readiness', 1, 10)
+            return cache.get('musician:readiness') == 1
+        except Exception:
+            logger.exception("Readiness check: cache unavailable")
+            return False
+
+
+class APIMetricsMiddleware:
+    """
+    Aggregate the Orchestra API calls performed by every view.
+
+    The summary (with the connection pool statistics of the worker process)
+    is logged (as JSON) on `musician.metrics` logger and, when DEBUG is
+    enabled, it's also included on the `Server-Timing` header of the
+    response. A warning is logged when a view exceeds API_CALLS_BUDGET.
+    The latency histograms of the process are logged from time to time.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics, token = start_request_metrics()
+        request.api_metrics = metrics
+        try:
+            response = self.get_response(request)
+        finally:
+            stop_request_metrics(token)
+
+        if metrics.view_name is None:
+            return response
+
+        summary = metrics.as_dict()
+        summary['status'] = response.status_code
+        # connections reuse of the worker process (since it started)
+        summary['pool'] = get_pool_stats()
+        metrics_logger.info(json.dumps(summary))
+
+        report = get_histograms_report()
+        if report is not None:
+            metrics_logger.info(json.dumps(report))
+
+        if len(metrics.calls) > musician_settings.API_CALLS_BUDGET:
+            metrics_logger.warning(
+                "View %s performed %s API calls (budget is %s)",
+                metrics.view_name, len(metrics.calls), musician_settings.API_CALLS_BUDGET,
+            )
+
+        if settings.DEBUG:
+            response['Server-Timing'] = metrics.server_timing()
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = get_request_metrics()
+        if metrics is not None and request.resolver_match is not None:
+            metrics.view_name = request.resolver_match.view_name
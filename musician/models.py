@@ -1,19 +1,90 @@
 import ast
+import hashlib
+import json
 import logging
 
-from django.utils.dateparse import parse_datetime
+from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
 from . import settings as musician_settings
-from .utils import get_bootstraped_percent
+from .utils import get_resource_usage
 
 
 logger = logging.getLogger(__name__)
 
 
-class OrchestraModel:
+class LazyRelation:
+    """
+    Nested model (or list of models) built from the JSON of the instance
+    the first time that it's accessed.
+    """
+
+    def __init__(self, model, many=True):
+        self.model = model
+        self.many = many
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.cache_name = '_' + name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        try:
+            return getattr(instance, self.cache_name)
+        except AttributeError:
+            pass
+
+        data = instance._json.get(self.name)
+        if data is None:
+            value = instance.param_defaults.get(self.name)
+        elif self.many:
+            value = self.model.new_list_from_json(data)
+        else:
+            value = self.model.new_from_json(data)
+
+        setattr(instance, self.cache_name, value)
+        return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.cache_name, value)
+
+
+class OrchestraModelBase(type):
+    """
+    Generate `__slots__` of the models based on their `param_defaults`, so
+    instances don't keep a `__dict__` besides the JSON they are built from.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        relations = {key for key, value in namespace.items() if isinstance(value, LazyRelation)}
+        if '__slots__' not in namespace:
+            inherited = set()
+            for base in bases:
+                for klass in base.__mro__:
+                    inherited.update(getattr(klass, '__slots__', ()))
+
+            params = namespace.get('param_defaults', {})
+            namespace['__slots__'] = tuple(
+                param for param in params if param not in namespace and param not in inherited
+            ) + tuple('_' + relation for relation in relations)
+
+        cls = super().__new__(mcs, name, bases, namespace)
+        if cls.verbose_name is None:
+            cls.verbose_name = cls.api_name
+
+        cls.relations = frozenset(relations.union(*(getattr(base, 'relations', ()) for base in bases)))
+
+        return cls
+
+
+class OrchestraModel(metaclass=OrchestraModelBase):
     """ Base class from which all orchestra models will inherit. """
+    __slots__ = ('_json', '_cache_version')
     api_name = None
     verbose_name = None
     fields = ()
@@ -21,11 +92,11 @@ class OrchestraModel:
     id = None
 
     def __init__(self, **kwargs):
-        if self.verbose_name is None:
-            self.verbose_name = self.api_name
-
+        self._json = kwargs
         for (param, default) in self.param_defaults.items():
-            setattr(self, param, kwargs.get(param, default))
+            # relations are built on demand from the JSON
+            if param not in self.relations:
+                setattr(self, param, kwargs.get(param, default))
 
 
     @classmethod
@@ -48,6 +119,29 @@ class OrchestraModel:
 
         return c
 
+    @property
+    def cache_version(self):
+        """Hash of the JSON of the instance: it changes when any of its data changes."""
+        try:
+            return self._cache_version
+        except AttributeError:
+            pass
+
+        def serialize(obj):
+            # nested instances (e.g. websites of a domain) are serialized as their JSON
+            if isinstance(obj, OrchestraModel):
+                return obj._json
+            return str(obj)
+
+        payload = json.dumps(self._json, sort_keys=True, default=serialize)
+        self._cache_version = hashlib.sha1(payload.encode()).hexdigest()
+        return self._cache_version
+
+    @classmethod
+    def new_list_from_json(cls, rows):
+        """ Create a list of instances based on a list of JSON dicts. """
+        return [cls.new_from_json(data) for data in rows]
+
     def __repr__(self):
         return '<%s: %s>' % (self.__class__.__name__, self)
 
@@ -55,6 +149,27 @@ class OrchestraModel:
         return '%s object (%s)' % (self.__class__.__name__, self.id)
 
 
+class ResourceUsageMixin:
+    """
+    Models with the usage of a resource available as `usage` (see
+    `utils.get_resource_usage`). It's extracted once when the instance is
+    created instead of every time that it's accessed.
+    """
+    __slots__ = ()
+    usage_resource = 'disk'
+
+    @classmethod
+    def get_resources(cls, data):
+        """Return the list of resources of the JSON of an instance."""
+        return data.get('resources')
+
+    @classmethod
+    def new_from_json(cls, data, **kwargs):
+        if data is not None and 'usage' not in kwargs:
+            kwargs['usage'] = get_resource_usage(cls.get_resources(data), cls.usage_resource)
+        return super().new_from_json(data, **kwargs)
+
+
 class Bill(OrchestraModel):
     api_name = 'bill'
     param_defaults = {
@@ -68,6 +183,14 @@ class Bill(OrchestraModel):
         "comments": "",
     }
 
+    @classmethod
+    def new_from_json(cls, data, **kwargs):
+        created_on = data.get('created_on')
+        if created_on:
+            created_on = parse_date(created_on)
+
+        return super().new_from_json(data=data, created_on=created_on, **kwargs)
+
 
 class BillingContact(OrchestraModel):
     param_defaults = {
@@ -142,7 +265,7 @@ class DatabaseUser(OrchestraModel):
     }
 
 
-class DatabaseService(OrchestraModel):
+class DatabaseService(ResourceUsageMixin, OrchestraModel):
     api_name = 'database'
     verbose_name = _('Databases')
     description = _('Description details for databases page.')
@@ -155,48 +278,22 @@ class DatabaseService(OrchestraModel):
         "usage": {},
     }
 
-    @classmethod
-    def new_from_json(cls, data, **kwargs):
-        users = None
-        if 'users' in data:
-            users = [DatabaseUser.new_from_json(user_data) for user_data in data['users']]
-
-        usage = cls.get_usage(data)
-
-        return super().new_from_json(data=data, users=users, usage=usage)
-
-    @classmethod
-    def get_usage(cls, data):
-        try:
-            resources = data['resources']
-            resource_disk = {}
-            for r in resources:
-                if r['name'] == 'disk':
-                    resource_disk = r
-                    break
-
-            details = {
-                'usage': float(resource_disk['used']),
-                'total': resource_disk['allocated'],
-                'unit': resource_disk['unit'],
-            }
-        except (IndexError, KeyError):
-            return {}
-
-
-        percent = get_bootstraped_percent(
-            details['usage'],
-            details['total']
-        )
-        details['percent'] = percent
-
-        return details
+    users = LazyRelation(DatabaseUser)
 
     @property
     def manager_url(self):
         return musician_settings.URL_DB_PHPMYADMIN
 
 
+class DomainRecord(OrchestraModel):
+    param_defaults = {
+        "type": None,
+        "value": None,
+    }
+    def __str__(self):
+        return '<%s: %s>' % (self.type, self.value)
+
+
 class Domain(OrchestraModel):
     api_name = 'domain'
     param_defaults = {
@@ -209,28 +306,13 @@ class Domain(OrchestraModel):
         "url": None,
     }
 
-    @classmethod
-    def new_from_json(cls, data, **kwargs):
-        records = cls.param_defaults.get("records")
-        if 'records' in data:
-            records = [DomainRecord.new_from_json(record_data) for record_data in data['records']]
-
-        return super().new_from_json(data=data, records=records)
+    records = LazyRelation(DomainRecord)
 
     def __str__(self):
         return self.name
 
 
-class DomainRecord(OrchestraModel):
-    param_defaults = {
-        "type": None,
-        "value": None,
-    }
-    def __str__(self):
-        return '<%s: %s>' % (self.type, self.value)
-
-
-class Address(OrchestraModel):
+class Address(ResourceUsageMixin, OrchestraModel):
     api_name = 'address'
     verbose_name = _('Mail addresses')
     description = _('Description details for mail addresses page.')
@@ -242,14 +324,21 @@ class Address(OrchestraModel):
         "mailboxes": [],
         "forward": None,
         'url': None,
+        'usage': {},
     }
 
     FORWARD = 'forward'
     MAILBOX = 'mailbox'
 
-    def __init__(self, **kwargs):
-        self.data = kwargs
-        super().__init__(**kwargs)
+    @classmethod
+    def get_resources(cls, data):
+        # usage of the (first) mailbox of the address
+        mailboxes = data.get('mailboxes') or [{}]
+        return mailboxes[0].get('resources')
+
+    @property
+    def data(self):
+        return self._json
 
     def deserialize(self):
         data = {
@@ -280,33 +369,10 @@ class Address(OrchestraModel):
     def type_detail(self):
         if self.type == self.FORWARD:
             return self.data['forward']
+        return self.usage
 
-        # retrieve mailbox usage
-        try:
-            resource = self.data['mailboxes'][0]['resources']
-            resource_disk = {}
-            for r in resource:
-                if r['name'] == 'disk':
-                    resource_disk = r
-                    break
-
-            mailbox_details = {
-                'usage': float(resource_disk['used']),
-                'total': resource_disk['allocated'],
-                'unit': resource_disk['unit'],
-            }
-
-            percent = get_bootstraped_percent(
-                mailbox_details['used'],
-                mailbox_details['total']
-            )
-            mailbox_details['percent'] = percent
-        except (IndexError, KeyError):
-            mailbox_details = {}
-        return mailbox_details
-
-
-class Mailbox(OrchestraModel):
+
+class Mailbox(ResourceUsageMixin, OrchestraModel):
     api_name = 'mailbox'
     verbose_name = _('Mailbox')
     description = _('Description details for mailbox page.')
@@ -318,12 +384,10 @@ class Mailbox(OrchestraModel):
         'is_active': True,
         'addresses': [],
         'url': None,
+        'usage': {},
     }
 
-    @classmethod
-    def new_from_json(cls, data, **kwargs):
-        addresses = [Address.new_from_json(addr) for addr in data.get('addresses', [])]
-        return super().new_from_json(data=data, addresses=addresses)
+    addresses = LazyRelation(Address)
 
     def deserialize(self):
         data = {
@@ -343,9 +407,9 @@ class MailinglistService(OrchestraModel):
         'admin_email': None,
     }
 
-    def __init__(self, **kwargs):
-        self.data = kwargs
-        super().__init__(**kwargs)
+    @property
+    def data(self):
+        return self._json
 
     @property
     def address_name(self):
@@ -393,10 +457,27 @@ class WebSite(OrchestraModel):
         "contents": [],
     }
 
-    @classmethod
-    def new_from_json(cls, data, **kwargs):
-        domains = cls.param_defaults.get("domains")
-        if 'domains' in data:
-            domains = [Domain.new_from_json(domain_data) for domain_data in data['domains']]
+    domains = LazyRelation(Domain)
 
-        return super().new_from_json(data=data, domains=domains)
+
+class ManagerNotification(models.Model):
+    """
+    Notification to the managers waiting to be sent.
+
+    Notifications are queued during the request and delivered by the
+    `sendnotifications` management command, so a slow mail server doesn't
+    delay the response to the user.
+    """
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ('created_at',)
+
+    def __str__(self):
+        return self.subject
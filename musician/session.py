@@ -0,0 +1,86 @@
+"""
+Process-wide HTTP session used to talk with the Orchestra API.
+
+Connections are pooled and kept alive between requests so the TCP and TLS
+handshakes are paid once per worker process instead of on every page.
+"""
+import logging
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import settings as musician_settings
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+
+
+def build_session():
+    session = requests.Session()
+
+    # the session is shared by all the users (each request provides its
+    # own token) so cookies must never be kept between requests
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    adapter = HTTPAdapter(
+        pool_connections=musician_settings.API_POOL_CONNECTIONS,
+        pool_maxsize=musician_settings.API_POOL_MAXSIZE,
+        pool_block=musician_settings.API_POOL_BLOCK,
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+def get_session():
+    """
+    Return the session shared by all the Orchestra clients of this process.
+
+    A new session is created after a fork (e.g. gunicorn workers with
+    preload enabled) to avoid sharing sockets between processes.
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _lock:
+            if _session is None or _session_pid != pid:
+                _session = build_session()
+                _session_pid = pid
+                logger.debug("HTTP session created for process %s", pid)
+
+    return _session
+
+
+def get_pool_stats():
+    """
+    Return connection reuse statistics of the current process.
+
+    `requests` is the number of requests sent, `connections` the number of
+    connections opened and `reused` how many requests used a kept-alive
+    connection.
+    """
+    stats = {'pid': os.getpid(), 'pools': 0, 'connections': 0, 'requests': 0}
+    if _session is None or _session_pid != os.getpid():
+        stats['reused'] = 0
+        return stats
+
+    adapters = {id(adapter): adapter for adapter in _session.adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            stats['pools'] += 1
+            stats['connections'] += pool.num_connections
+            stats['requests'] += pool.num_requests
+
+    stats['reused'] = max(0, stats['requests'] - stats['connections'])
+    return stats
@@ -4,7 +4,8 @@ from django.conf import settings
 
 def getsetting(name):
     value = getattr(settings, name, None)
-    return value or DEFAULTS.get(name)
+    # falsy values (e.g. no retries) are valid settings
+    return DEFAULTS.get(name) if value is None else value
 
 # provide a default value allowing to overwrite it for each type of account
 def allowed_resources_default_factory():
@@ -28,15 +29,153 @@ DEFAULTS = {
             }
         }
     ),
+    # cache backend (alias of CACHES setting) used to store API data
+    "CACHE_ALIAS": "default",
+    # seconds that a verified token (and its profile) is trusted without asking the API
+    "CREDENTIALS_CACHE_TTL": 60,
+    # seconds that a list of services is cached by resource (api_name);
+    # resources not included here are always requested to the API
+    "API_CACHE_TTL": {
+        'address': 60,
+        'database': 300,
+        'domain': 300,
+        'mailbox': 60,
+        'mailinglist': 300,
+        'saas': 300,
+        'website': 300,
+    },
+    # seconds that the payload of a response may be served (stale) while
+    # the API is unavailable
+    "API_STALE_IF_ERROR_TTL": 10 * 60,
+    # seconds that the validators (ETag, Last-Modified) and the payload of
+    # a response are kept to perform conditional requests
+    "API_VALIDATORS_TTL": 24 * 60 * 60,
+    # max number of API calls expected on a view (a warning is logged if exceeded)
+    "API_CALLS_BUDGET": 10,
+    # seconds that a resource not paginated by the API is remembered (its
+    # pages are not requested but the whole list)
+    "API_UNPAGINATED_TTL": 24 * 60 * 60,
+    # timeouts (in seconds) to connect to the API and to wait for its responses
+    "API_CONNECT_TIMEOUT": 3.05,
+    "API_READ_TIMEOUT": 30,
+    # retries of idempotent requests on connection errors and 502/503/504
+    # responses: the delay (in seconds) is doubled on each retry (with jitter)
+    "API_RETRIES": 2,
+    "API_RETRY_BACKOFF": 0.2,
+    # circuit breaker: stop sending requests during API_BREAKER_COOLDOWN
+    # seconds when at least API_BREAKER_THRESHOLD of the requests (and no
+    # less than API_BREAKER_MIN_CALLS) of the last API_BREAKER_WINDOW seconds failed
+    "API_BREAKER_THRESHOLD": 0.5,
+    "API_BREAKER_MIN_CALLS": 10,
+    "API_BREAKER_WINDOW": 30,
+    "API_BREAKER_COOLDOWN": 15,
+    # max number of concurrent requests to the API when resolving independent calls
+    "API_MAX_WORKERS": 4,
+    # HTTP connection pool shared by the API clients of a process:
+    # number of hosts to keep pools for, connections kept per host and
+    # whether to wait for a free connection when the pool is exhausted
+    "API_POOL_CONNECTIONS": 4,
+    "API_POOL_MAXSIZE": 10,
+    "API_POOL_BLOCK": False,
+    # directory where bill documents are stored (disabled if None) and
+    # max size in bytes before evicting least recently used ones
+    "BILL_STORAGE_DIR": None,
+    "BILL_STORAGE_MAX_SIZE": 256 * 1024 * 1024,
+    # seconds after which the dashboard snapshot of an account is refreshed in
+    # background (soft) and discarded (hard); and max concurrent refreshes
+    "DASHBOARD_SNAPSHOT_SOFT_TTL": 60,
+    "DASHBOARD_SNAPSHOT_HARD_TTL": 60 * 60,
+    "DASHBOARD_SNAPSHOT_WORKERS": 2,
+    # seconds that template fragments rendered from an object are cached
+    "FRAGMENT_CACHE_TTL": 60 * 60,
+    # paths of the liveness and readiness checks (they don't use the API)
+    "HEALTH_CHECK_PATH": "/healthz/",
+    "READINESS_CHECK_PATH": "/readyz/",
+    # seconds between logs of the latency histograms of the API calls (by worker)
+    "METRICS_REPORT_INTERVAL": 5 * 60,
+    # queued notifications to managers: seconds that a batch is claimed by a
+    # worker while it's being sent, max number of attempts to send them,
+    # delay in seconds before the first retry (doubled on each attempt) and
+    # days that sent notifications are kept
+    "NOTIFICATION_CLAIM_TTL": 5 * 60,
+    "NOTIFICATION_MAX_ATTEMPTS": 5,
+    "NOTIFICATION_RETENTION_DAYS": 30,
+    "NOTIFICATION_RETRY_DELAY": 60,
     "URL_DB_PHPMYADMIN": "https://phpmyadmin.pangea.org/",
     "URL_MAILTRAIN": "https://grups.pangea.org/",
     "URL_SAAS_GITLAB": "https://gitlab.pangea.org/",
     "URL_SAAS_OWNCLOUD": "https://nextcloud.pangea.org/",
     "URL_SAAS_WORDPRESS": "https://blog.pangea.org/",
+    # seconds that the usage totals of an account (disk, mailboxes...) are cached
+    "USAGE_CACHE_TTL": 5 * 60,
 }
 
 ALLOWED_RESOURCES = getsetting("ALLOWED_RESOURCES")
 
+API_BREAKER_COOLDOWN = getsetting("API_BREAKER_COOLDOWN")
+
+API_BREAKER_MIN_CALLS = getsetting("API_BREAKER_MIN_CALLS")
+
+API_BREAKER_THRESHOLD = getsetting("API_BREAKER_THRESHOLD")
+
+API_BREAKER_WINDOW = getsetting("API_BREAKER_WINDOW")
+
+API_CALLS_BUDGET = getsetting("API_CALLS_BUDGET")
+
+API_CONNECT_TIMEOUT = getsetting("API_CONNECT_TIMEOUT")
+
+API_MAX_WORKERS = getsetting("API_MAX_WORKERS")
+
+API_POOL_CONNECTIONS = getsetting("API_POOL_CONNECTIONS")
+
+API_POOL_MAXSIZE = getsetting("API_POOL_MAXSIZE")
+
+API_POOL_BLOCK = getsetting("API_POOL_BLOCK")
+
+API_READ_TIMEOUT = getsetting("API_READ_TIMEOUT")
+
+API_RETRIES = getsetting("API_RETRIES")
+
+API_RETRY_BACKOFF = getsetting("API_RETRY_BACKOFF")
+
+API_CACHE_TTL = getsetting("API_CACHE_TTL")
+
+API_STALE_IF_ERROR_TTL = getsetting("API_STALE_IF_ERROR_TTL")
+
+API_UNPAGINATED_TTL = getsetting("API_UNPAGINATED_TTL")
+
+API_VALIDATORS_TTL = getsetting("API_VALIDATORS_TTL")
+
+BILL_STORAGE_DIR = getsetting("BILL_STORAGE_DIR")
+
+BILL_STORAGE_MAX_SIZE = getsetting("BILL_STORAGE_MAX_SIZE")
+
+CACHE_ALIAS = getsetting("CACHE_ALIAS")
+
+CREDENTIALS_CACHE_TTL = getsetting("CREDENTIALS_CACHE_TTL")
+
+DASHBOARD_SNAPSHOT_HARD_TTL = getsetting("DASHBOARD_SNAPSHOT_HARD_TTL")
+
+DASHBOARD_SNAPSHOT_SOFT_TTL = getsetting("DASHBOARD_SNAPSHOT_SOFT_TTL")
+
+DASHBOARD_SNAPSHOT_WORKERS = getsetting("DASHBOARD_SNAPSHOT_WORKERS")
+
+FRAGMENT_CACHE_TTL = getsetting("FRAGMENT_CACHE_TTL")
+
+HEALTH_CHECK_PATH = getsetting("HEALTH_CHECK_PATH")
+
+READINESS_CHECK_PATH = getsetting("READINESS_CHECK_PATH")
+
+METRICS_REPORT_INTERVAL = getsetting("METRICS_REPORT_INTERVAL")
+
+NOTIFICATION_CLAIM_TTL = getsetting("NOTIFICATION_CLAIM_TTL")
+
+NOTIFICATION_MAX_ATTEMPTS = getsetting("NOTIFICATION_MAX_ATTEMPTS")
+
+NOTIFICATION_RETENTION_DAYS = getsetting("NOTIFICATION_RETENTION_DAYS")
+
+NOTIFICATION_RETRY_DELAY = getsetting("NOTIFICATION_RETRY_DELAY")
+
 URL_DB_PHPMYADMIN = getsetting("URL_DB_PHPMYADMIN")
 
 URL_MAILTRAIN = getsetting("URL_MAILTRAIN")
@@ -46,3 +185,5 @@ URL_SAAS_GITLAB = getsetting("URL_SAAS_GITLAB")
 URL_SAAS_OWNCLOUD = getsetting("URL_SAAS_OWNCLOUD")
 
 URL_SAAS_WORDPRESS = getsetting("URL_SAAS_WORDPRESS")
+
+USAGE_CACHE_TTL = getsetting("USAGE_CACHE_TTL")
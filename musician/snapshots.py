@@ -0,0 +1,118 @@
+"""
+Dashboard snapshots (stale-while-revalidate).
+
+The data of the dashboard of every account is cached as a snapshot. A
+snapshot older than DASHBOARD_SNAPSHOT_SOFT_TTL is still served but it's
+rebuilt in background, so the dashboard doesn't wait for the API. Snapshots
+older than DASHBOARD_SNAPSHOT_HARD_TTL are discarded (and rebuilt while the
+user waits), as well as the snapshot of an account after any write
+operation.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.utils import timezone
+
+from . import settings as musician_settings
+from .cache import get_cache, make_token_key
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=musician_settings.DASHBOARD_SNAPSHOT_WORKERS,
+                thread_name_prefix='musician-snapshots',
+            )
+    return _executor
+
+
+def make_snapshot_key(token):
+    return make_token_key(token, 'dashboard')
+
+
+def make_generation_key(token):
+    return make_token_key(token, 'dashboard', 'generation')
+
+
+def build_dashboard_snapshot(orchestra):
+    """
+    Retrieve the data of the dashboard and store it as a new snapshot
+    (unless it has been forgotten meanwhile, e.g. by a write operation).
+    """
+    cache = get_cache()
+    generation_key = make_generation_key(orchestra.auth_token)
+    generation = cache.get(generation_key, 0)
+
+    snapshot = {
+        'created_at': timezone.now(),
+        # the snapshot must be fresher than the cached lists (used by other views)
+        'domains': orchestra.retrieve_domain_list(use_cache=False),
+    }
+    if cache.get(generation_key, 0) != generation:
+        # the retrieved data may be older than the write operation
+        return snapshot
+
+    cache.set(
+        make_snapshot_key(orchestra.auth_token),
+        snapshot,
+        musician_settings.DASHBOARD_SNAPSHOT_HARD_TTL,
+    )
+    return snapshot
+
+
+def get_dashboard_snapshot(orchestra):
+    """
+    Returns:
+      A dict with the `domains` of the account and when they were
+      retrieved (`created_at`).
+    """
+    snapshot = get_cache().get(make_snapshot_key(orchestra.auth_token))
+    if snapshot is None:
+        return build_dashboard_snapshot(orchestra)
+
+    age = (timezone.now() - snapshot['created_at']).total_seconds()
+    if age > musician_settings.DASHBOARD_SNAPSHOT_SOFT_TTL:
+        refresh_in_background(orchestra)
+    return snapshot
+
+
+def refresh_in_background(orchestra):
+    """Rebuild the snapshot on another thread (returns its future if started)."""
+    token = orchestra.auth_token
+
+    # only one refresh at a time by account (on every process sharing the cache)
+    lock_key = make_token_key(token, 'dashboard', 'refreshing')
+    if not get_cache().add(lock_key, True, musician_settings.DASHBOARD_SNAPSHOT_SOFT_TTL):
+        return None
+
+    def refresh():
+        try:
+            # the client of the request can't be used once it has finished
+            build_dashboard_snapshot(type(orchestra)(auth_token=token, base_url=orchestra.base_url))
+        except Exception:
+            logger.exception("Cannot refresh dashboard snapshot")
+        finally:
+            get_cache().delete(lock_key)
+
+    return get_executor().submit(refresh)
+
+
+def forget_dashboard_snapshot(token):
+    cache = get_cache()
+    cache.delete(make_snapshot_key(token))
+
+    # discard the snapshots being built
+    key = make_generation_key(token)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
@@ -0,0 +1,140 @@
+"""
+Local storage of bill documents.
+
+Issued bills never change so their documents are kept on disk to avoid
+requesting them again to the API. Documents are stored by the hash of
+their content (an identical document is stored once) and every account
+has its own index mapping its bills to documents: an account can only
+reach the documents that it has retrieved from the API.
+
+When the storage exceeds its max size the least recently used documents
+are removed.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from . import settings as musician_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class BillDocumentStore:
+    def __init__(self, root, max_size):
+        self.root = root
+        self.max_size = max_size
+        self.objects_dir = os.path.join(root, 'objects')
+        self.index_dir = os.path.join(root, 'index')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self._evict_lock = threading.Lock()
+
+        for path in [self.objects_dir, self.index_dir, self.tmp_dir]:
+            os.makedirs(path, exist_ok=True)
+
+    def get_index_path(self, account, pk):
+        account_hash = hashlib.sha256(str(account).encode()).hexdigest()
+        return os.path.join(self.index_dir, account_hash, str(pk))
+
+    def get_object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def open(self, account, pk):
+        """
+        Returns:
+          A tuple (file, metadata) with the document of the bill opened
+          for reading or None if the account doesn't have it stored.
+        """
+        index_path = self.get_index_path(account, pk)
+        try:
+            with open(index_path) as index_file:
+                metadata = json.load(index_file)
+            object_path = self.get_object_path(metadata['digest'])
+            document = open(object_path, 'rb')
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError):
+            logger.warning("Removing invalid bill index %s", index_path)
+            os.remove(index_path)
+            return None
+
+        # keep track of the last use to evict least recently used documents
+        os.utime(object_path)
+        return document, metadata
+
+    def save(self, account, pk, chunks, metadata):
+        """
+        Store the document of a bill while iterating over its `chunks`.
+
+        Returns a generator that yields the same chunks: the document is
+        stored once it has been completely consumed.
+        """
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    tmp_file.write(chunk)
+                    yield chunk
+
+            object_path = self.get_object_path(digest.hexdigest())
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(tmp_path, object_path)
+            self.write_index(account, pk, dict(metadata, digest=digest.hexdigest()))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self.evict()
+
+    def write_index(self, account, pk, metadata):
+        index_path = self.get_index_path(account, pk)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(metadata, tmp_file)
+        os.replace(tmp_path, index_path)
+
+    def evict(self):
+        """Remove least recently used documents until fitting on max size."""
+        with self._evict_lock:
+            documents = []
+            for dirpath, _, filenames in os.walk(self.objects_dir):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    documents.append((stat.st_mtime, stat.st_size, path))
+
+            total_size = sum(size for _, size, _ in documents)
+            for _, size, path in sorted(documents):
+                if total_size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+
+
+_store = None
+
+
+def get_bill_store():
+    """Return the bill document store or None if it's disabled."""
+    global _store
+    if musician_settings.BILL_STORAGE_DIR is None:
+        return None
+
+    if _store is None:
+        _store = BillDocumentStore(
+            musician_settings.BILL_STORAGE_DIR,
+            musician_settings.BILL_STORAGE_MAX_SIZE,
+        )
+    return _store
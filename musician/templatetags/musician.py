@@ -1,6 +1,53 @@
+from django import template
 from django.template.defaulttags import register
 
+from .. import settings as musician_settings
+from ..cache import get_cache, make_object_fragment_key
+
 
 @register.filter
 def get_item(dictionary, key):
     return dictionary.get(key)
+
+
+class CacheFragmentNode(template.Node):
+    def __init__(self, nodelist, name, obj):
+        self.nodelist = nodelist
+        self.name = name
+        self.obj = obj
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        key = make_object_fragment_key(name, self.obj.resolve(context))
+
+        cache = get_cache()
+        # fragments of the page may have been retrieved at once by the view
+        fragments = context.get('cached_fragments', {}).get(name)
+        value = cache.get(key) if fragments is None else fragments.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, musician_settings.FRAGMENT_CACHE_TTL)
+        return value
+
+
+@register.tag
+def cache_fragment(parser, token):
+    """
+    Cache a fragment of template that only depends on an Orchestra object
+    (and the active language). It's rendered again when its data changes:
+
+        {% cache_fragment "mailbox-row" mailbox %}
+            ...
+        {% endcache_fragment %}
+
+    Views may retrieve the fragments of a page at once and provide them on
+    the `cached_fragments` context variable (see `get_cached_fragments`).
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(
+            "'{}' tag requires a fragment name and an object.".format(bits[0]))
+
+    nodelist = parser.parse(('endcache_fragment',))
+    parser.delete_first_token()
+    return CacheFragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
@@ -1,7 +1,98 @@
-from django.test import TestCase
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-from .models import DatabaseService, UserAccount
-from .utils import get_bootstraped_percent
+import requests
+from django.conf import settings
+from django.core import mail
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import DatabaseError
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from . import settings as musician_settings
+from .api import Orchestra
+from .auth import SESSION_KEY_TOKEN, logout
+from .breaker import CircuitOpenError, get_breaker
+from .cache import check_shared_cache, get_cache, get_cached_fragments, make_resource_key, make_token_key, make_url_key
+from .fakeapi import DEFAULT_SIZES, FakeOrchestraServer
+from .metrics import get_latency_histograms
+from .management.commands.sendnotifications import Command as SendNotificationsCommand
+from .session import get_pool_stats, get_session
+from .snapshots import build_dashboard_snapshot, make_snapshot_key, refresh_in_background
+from .storage import BillDocumentStore
+from .usage import aggregate_usage, make_usage_key
+from .models import (Address, Bill, DatabaseService, Domain, Mailbox, ManagerNotification, SaasService,
+                     UserAccount, WebSite)
+from .utils import get_bootstraped_percent, get_resource_usage
+
+
+class StubOrchestraHandler(BaseHTTPRequestHandler):
+    """Minimal Orchestra API: serves `responses` of the server as JSON."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.received.append((self.path, dict(self.headers)))
+        self.send_json(self.server.responses.get(self.path, []), status=self.server.statuses.get(self.path, 200))
+
+    def send_json(self, payload, status=200, headers=None):
+        if isinstance(payload, bytes):
+            body, content_type = payload, 'application/pdf'
+        else:
+            body, content_type = json.dumps(payload).encode(), 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubOrchestraMixin:
+    """Run a local stub of the Orchestra API during the test case."""
+    handler_class = StubOrchestraHandler
+    profile = {'username': 'pepe', 'type': 'INDIVIDUAL', 'language': 'CA'}
+
+    def setUp(self):
+        super().setUp()
+        get_cache().clear()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler_class)
+        self.server.responses = {}
+        self.server.statuses = {}
+        self.server.received = []
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.base_url = 'http://127.0.0.1:{}/api/'.format(self.server.server_port)
+        self.orchestra = Orchestra(auth_token='fake-token', base_url=self.base_url)
+
+        api_settings = override_settings(API_BASE_URL=self.base_url)
+        api_settings.enable()
+        self.addCleanup(api_settings.disable)
+
+    def login(self):
+        """Authenticate the test client with the token of `self.orchestra`."""
+        self.server.responses['/api/accounts/'] = [self.profile]
+        session = self.client.session
+        session[SESSION_KEY_TOKEN] = self.orchestra.auth_token
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
 
 
 class DatabaseTest(TestCase):
@@ -32,7 +123,70 @@ class DatabaseTest(TestCase):
         self.assertEqual(0, database.usage['percent'])
 
 
+class AddressTest(TestCase):
+    def test_address_is_compact(self):
+        data = {
+            'id': 1,
+            'name': 'info',
+            'names': ['info', 'contact'],
+            'domain': {'name': 'example.org', 'url': 'https://example.org/api/domains/1/'},
+            'mailboxes': [],
+            'forward': 'info@example.net',
+        }
+        address = Address.new_from_json(data)
+
+        self.assertFalse(hasattr(address, '__dict__'))
+        self.assertIs(data, address.data)
+        self.assertEqual(Address.FORWARD, address.type)
+        self.assertEqual(['contact@example.org'], address.aliases)
+
+    def test_mailbox_usage(self):
+        data = {
+            'id': 1,
+            'name': 'info',
+            'domain': {'name': 'example.org'},
+            'mailboxes': [{'id': 1, 'resources': [
+                {'name': 'traffic', 'used': '3', 'allocated': '10', 'unit': 'GiB'},
+                {'name': 'disk', 'used': '0.5', 'allocated': '2', 'unit': 'GiB'},
+            ]}],
+            'forward': '',
+        }
+        address = Address.new_from_json(data)
+
+        self.assertEqual(Address.MAILBOX, address.type)
+        self.assertEqual({'usage': 0.5, 'total': '2', 'unit': 'GiB', 'percent': 25}, address.type_detail)
+
+
+class MailboxTest(TestCase):
+    def test_addresses_are_built_on_demand(self):
+        data = {
+            'id': 1,
+            'name': 'pepe',
+            'addresses': [{'id': 2, 'name': 'info', 'domain': {'name': 'example.org'}, 'forward': ''}],
+        }
+        with mock.patch.object(Address, 'new_from_json', wraps=Address.new_from_json) as new_address:
+            mailbox = Mailbox.new_from_json(data)
+            self.assertEqual(0, new_address.call_count)
+
+            self.assertEqual('info@example.org', mailbox.addresses[0].full_address_name)
+            self.assertIs(mailbox.addresses, mailbox.addresses)
+            self.assertEqual(1, new_address.call_count)
+
+    def test_mailbox_without_addresses(self):
+        mailbox = Mailbox.new_from_json({'id': 1, 'name': 'pepe'})
+        self.assertEqual([], mailbox.addresses)
+        self.assertEqual({'addresses': []}, mailbox.deserialize())
+
+
 class DomainsTestCase(TestCase):
+    def setUp(self):
+        self.server = FakeOrchestraServer(sizes={'domains': 2}).start()
+        self.addCleanup(self.server.stop)
+        get_cache().clear()
+        api_settings = override_settings(API_BASE_URL=self.server.base_url)
+        api_settings.enable()
+        self.addCleanup(api_settings.disable)
+
     def test_domain_not_found(self):
         response = self.client.post(
             '/auth/login/',
@@ -44,6 +198,815 @@ class DomainsTestCase(TestCase):
         response = self.client.get('/domains/3/')
         self.assertEqual(404, response.status_code)
 
+    def test_domain_detail(self):
+        self.client.post('/auth/login/', {'username': 'admin', 'password': 'admin'})
+
+        response = self.client.get('/domains/2/')
+        self.assertContains(response, 'domain2.example.org')
+
+    def test_paginated_list(self):
+        orchestra = Orchestra(username='admin', password='admin')
+        bills = orchestra.retrieve_lazy_service_list(Bill, page=2, per_page=5)
+
+        page = Paginator(bills, 5).page(2)
+        self.assertEqual(DEFAULT_SIZES['bills'], page.paginator.count)
+        self.assertEqual([6, 7, 8, 9, 10], [bill.id for bill in page])
+
+
+class DomainListTest(TestCase):
+    DOMAINS = [
+        {'id': 1, 'name': 'example.org', 'url': 'https://example.org/api/domains/1/'},
+        {'id': 2, 'name': 'example.net', 'url': 'https://example.org/api/domains/2/'},
+    ]
+    ADDRESSES = [
+        {'id': 10, 'name': 'info', 'domain': {'id': 1, 'name': 'example.org'}},
+        {'id': 11, 'name': 'admin', 'domain': {'id': 1, 'name': 'example.org'}},
+    ]
+    WEBSITES = [
+        {'id': 20, 'name': 'web', 'domains': [{'id': 1, 'name': 'example.org'}, {'id': 2, 'name': 'example.net'}]},
+        {'id': 21, 'name': 'blog', 'domains': [{'id': 2, 'name': 'example.net'}]},
+    ]
+
+    def retrieve_service_list(self, service_name, querystring=None, use_cache=True):
+        self.calls.append((service_name, querystring))
+        if service_name == 'domain':
+            return [dict(domain) for domain in self.DOMAINS]
+        if service_name == 'address':
+            return self.ADDRESSES
+        if service_name == 'website':
+            return self.WEBSITES
+        return []
+
+    def setUp(self):
+        self.calls = []
+        self.orchestra = Orchestra(auth_token='fake-token')
+
+    def test_addresses_fetched_once(self):
+        with mock.patch.object(self.orchestra, 'retrieve_service_list', self.retrieve_service_list):
+            domains = self.orchestra.retrieve_domain_list()
+
+        self.assertEqual(1, self.calls.count(('address', None)))
+        self.assertEqual(2, len(domains[0].addresses))
+        self.assertEqual([], domains[1].addresses)
+
+    def test_fallback_when_domain_is_missing(self):
+        self.ADDRESSES = [{'id': 10, 'name': 'info'}]
+        with mock.patch.object(self.orchestra, 'retrieve_service_list', self.retrieve_service_list):
+            self.orchestra.retrieve_domain_list()
+
+        self.assertIn(('address', 'domain=1'), self.calls)
+        self.assertIn(('address', 'domain=2'), self.calls)
+
+    def test_websites_by_domain(self):
+        with mock.patch.object(self.orchestra, 'retrieve_service_list', self.retrieve_service_list):
+            domains = self.orchestra.retrieve_domain_list()
+
+        self.assertEqual(['web'], [website.name for website in domains[0].websites])
+        self.assertEqual(['web', 'blog'], [website.name for website in domains[1].websites])
+        # the domains of the websites are not built to index them
+        self.assertFalse(hasattr(domains[0].websites[0], '_domains'))
+
+    def test_address_choices(self):
+        self.ADDRESSES = [dict(address, url='https://example.org/api/addresses/{}/'.format(address['id']))
+                          for address in self.ADDRESSES]
+        with mock.patch.object(self.orchestra, 'retrieve_service_list', self.retrieve_service_list):
+            choices = self.orchestra.retrieve_address_choices()
+
+        self.assertEqual([
+            ('https://example.org/api/addresses/10/', 'info@example.org'),
+            ('https://example.org/api/addresses/11/', 'admin@example.org'),
+        ], choices)
+
+
+class CredentialsCacheTest(TestCase):
+    PROFILE = [{'username': 'pepe', 'type': 'INDIVIDUAL', 'language': 'CA'}]
+
+    def setUp(self):
+        get_cache().clear()
+        self.orchestra = Orchestra(auth_token='fake-token')
+
+    def test_profile_reuses_verification(self):
+        with mock.patch.object(self.orchestra, 'request', return_value=(200, self.PROFILE)) as request:
+            self.assertEqual(self.PROFILE, self.orchestra.verify_credentials())
+            profile = self.orchestra.retrieve_profile()
+
+        self.assertEqual(1, request.call_count)
+        self.assertEqual('pepe', profile.username)
+
+    def test_invalid_token_is_not_cached(self):
+        with mock.patch.object(self.orchestra, 'request', return_value=(401, {})) as request:
+            self.assertIsNone(self.orchestra.verify_credentials())
+            self.assertIsNone(self.orchestra.verify_credentials())
+
+        self.assertEqual(2, request.call_count)
+
+    def test_logout_invalidates_verification(self):
+        http_request = RequestFactory().get('/auth/logout/')
+        http_request.session = self.client.session
+        http_request.session[SESSION_KEY_TOKEN] = 'fake-token'
+
+        with mock.patch.object(self.orchestra, 'request', return_value=(200, self.PROFILE)) as request:
+            self.orchestra.verify_credentials()
+            logout(http_request)
+            self.orchestra.verify_credentials()
+
+        self.assertEqual(2, request.call_count)
+
+
+class SessionPoolTest(StubOrchestraMixin, TestCase):
+    def test_session_is_shared(self):
+        other = Orchestra(auth_token='other-token', base_url=self.base_url)
+        self.assertIs(get_session(), self.orchestra.session)
+        self.assertIs(self.orchestra.session, other.session)
+
+    def test_connections_are_reused(self):
+        # discard pools (and their stats) opened by previous tests
+        get_session().close()
+        for _ in range(3):
+            Orchestra(auth_token='fake-token', base_url=self.base_url).retrieve_service_list('bill')
+        stats = get_pool_stats()
+
+        self.assertEqual(3, stats['requests'])
+        self.assertEqual(1, stats['connections'])
+        self.assertEqual(2, stats['reused'])
+
+
+class ServiceListCacheTest(StubOrchestraMixin, TestCase):
+    def test_list_is_cached(self):
+        self.orchestra.retrieve_service_list('domain')
+        self.orchestra.retrieve_service_list('domain')
+        self.orchestra.retrieve_service_list('domain', querystring='name=example.org')
+
+        self.assertEqual(2, len(self.server.received))
+
+    def test_list_is_cached_by_token(self):
+        other = Orchestra(auth_token='other-token', base_url=self.base_url)
+        self.orchestra.retrieve_service_list('domain')
+        other.retrieve_service_list('domain')
+
+        self.assertEqual(2, len(self.server.received))
+
+    def test_write_invalidates_list(self):
+        self.orchestra.retrieve_service_list('mailbox')
+        self.orchestra.retrieve_service_list('address', querystring='domain=1')
+        with mock.patch.object(self.orchestra, 'send', return_value=(200, {})):
+            self.orchestra.update_mailbox(1, {'addresses': []})
+        self.orchestra.retrieve_service_list('mailbox')
+        self.orchestra.retrieve_service_list('address', querystring='domain=1')
+
+        self.assertEqual(4, len(self.server.received))
+
+
+class ConditionalStubHandler(StubOrchestraHandler):
+    """Stub that answers `304 Not Modified` when the ETag matches."""
+
+    def do_GET(self):
+        self.server.received.append((self.path, dict(self.headers)))
+        etag = '"{}"'.format(self.server.version)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+        else:
+            self.send_json([{'version': self.server.version}], headers={'ETag': etag})
+
+
+class ConditionalRequestTest(StubOrchestraMixin, TestCase):
+    handler_class = ConditionalStubHandler
+
+    def setUp(self):
+        super().setUp()
+        self.server.version = 1
+
+    def new_orchestra(self):
+        return Orchestra(auth_token='fake-token', base_url=self.base_url)
+
+    def test_not_modified_serves_stored_payload(self):
+        self.orchestra.request('GET', 'bill-list')
+        status, output = self.new_orchestra().request('GET', 'bill-list')
+
+        self.assertEqual(200, status)
+        self.assertEqual([{'version': 1}], output)
+        self.assertEqual('"1"', self.server.received[1][1].get('If-None-Match'))
+
+    def test_modified_payload_is_refreshed(self):
+        self.orchestra.request('GET', 'bill-list')
+        self.server.version = 2
+        _, output = self.new_orchestra().request('GET', 'bill-list')
+
+        self.assertEqual([{'version': 2}], output)
+
+    def test_response_without_validators_is_not_stored(self):
+        self.server.responses['/api/bills/'] = [{'id': 1}]
+        with mock.patch.object(ConditionalStubHandler, 'do_GET', StubOrchestraHandler.do_GET):
+            self.orchestra.request('GET', 'bill-list')
+
+        key = make_url_key(self.orchestra.auth_token, 'validators', self.base_url + 'bills/')
+        self.assertIsNone(get_cache().get(key))
+
+    def test_validators_are_not_shared_between_tokens(self):
+        other = Orchestra(auth_token='other-token', base_url=self.base_url)
+        self.orchestra.request('GET', 'bill-list')
+        other.request('GET', 'bill-list')
+
+        self.assertNotIn('If-None-Match', self.server.received[1][1])
+
+
+class FlakyStubHandler(StubOrchestraHandler):
+    """Stub that fails the next `failures` requests and delays every response."""
+
+    def do_GET(self):
+        self.server.received.append((self.path, dict(self.headers)))
+        time.sleep(self.server.delay)
+        try:
+            if self.server.failures:
+                self.server.failures -= 1
+                self.send_json({'detail': 'Service unavailable'}, status=503)
+            else:
+                self.send_json(self.server.responses.get(self.path, []), headers={'ETag': '"1"'})
+        except BrokenPipeError:
+            # the client has timed out
+            pass
+
+    do_POST = do_GET
+
+
+class GatherTest(StubOrchestraMixin, TestCase):
+    handler_class = FlakyStubHandler
+
+    def setUp(self):
+        super().setUp()
+        self.server.failures = 0
+        self.server.delay = 0.2
+        self.server.responses.update({'/api/bills/': [{'id': 1}], '/api/domains/': [{'id': 2}]})
+
+    def test_calls_are_concurrent(self):
+        start = time.monotonic()
+        related = self.orchestra.gather(
+            bills=partial(self.orchestra.request, 'GET', 'bill-list'),
+            domains=partial(self.orchestra.request, 'GET', 'domain-list'),
+        )
+        elapsed = time.monotonic() - start
+
+        self.assertEqual({'bills': (200, [{'id': 1}]), 'domains': (200, [{'id': 2}])}, related)
+        self.assertLess(elapsed, 2 * self.server.delay)
+
+    def test_exception_is_propagated(self):
+        def fail():
+            raise ValueError('unexpected')
+
+        with self.assertRaises(ValueError):
+            self.orchestra.gather(
+                bills=partial(self.orchestra.request, 'GET', 'bill-list'),
+                other=fail,
+            )
+
+
+class ResilienceTest(StubOrchestraMixin, TestCase):
+    handler_class = FlakyStubHandler
+
+    def setUp(self):
+        super().setUp()
+        self.server.failures = 0
+        self.server.delay = 0
+        self.server.responses['/api/bills/'] = [{'id': 1}]
+        patcher = mock.patch('musician.settings.API_RETRY_BACKOFF', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def new_orchestra(self):
+        return Orchestra(auth_token='fake-token', base_url=self.base_url)
+
+    def test_idempotent_request_is_retried(self):
+        self.server.failures = 1
+        status, output = self.orchestra.request('GET', 'bill-list')
+
+        self.assertEqual((200, [{'id': 1}]), (status, output))
+        self.assertEqual(2, len(self.server.received))
+
+    def test_write_is_not_retried(self):
+        self.server.failures = 1
+        status, _ = self.orchestra.request('POST', 'bill-list', raise_exception=False)
+
+        self.assertEqual(503, status)
+        self.assertEqual(1, len(self.server.received))
+
+    def test_timeout(self):
+        self.server.delay = 0.2
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            self.orchestra.request('GET', 'bill-list', timeout=(1, 0.05))
+
+    def test_stale_payload_when_unavailable(self):
+        self.orchestra.request('GET', 'bill-list')
+        self.server.failures = 100
+
+        status, output = self.new_orchestra().request('GET', 'bill-list')
+        self.assertEqual((200, [{'id': 1}]), (status, output))
+
+    def test_stale_payload_expires(self):
+        self.orchestra.request('GET', 'bill-list')
+        self.server.failures = 100
+
+        with mock.patch('musician.settings.API_STALE_IF_ERROR_TTL', 0):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                self.new_orchestra().request('GET', 'bill-list')
+
+    def test_stale_list_is_not_cached(self):
+        self.server.responses['/api/mailboxes/'] = [{'id': 1}]
+        self.orchestra.request('GET', 'mailbox-list')
+        self.server.failures = 100
+
+        orchestra = self.new_orchestra()
+        self.assertEqual([{'id': 1}], orchestra.retrieve_service_list('mailbox'))
+        self.assertTrue(orchestra.is_stale('mailbox-list'))
+        self.assertIsNone(get_cache().get(make_resource_key('fake-token', 'mailbox', None)))
+
+    def test_circuit_breaker(self):
+        breaker = get_breaker(self.base_url)
+        self.server.failures = 100
+        # 3 attempts by request
+        for _ in range(3):
+            self.new_orchestra().request('GET', 'bill-list', raise_exception=False)
+        self.assertEqual(breaker.CLOSED, breaker.state)
+
+        # the circuit is opened on the 10th failure
+        with self.assertRaises(CircuitOpenError):
+            self.new_orchestra().request('GET', 'bill-list', raise_exception=False)
+        self.assertEqual(breaker.OPEN, breaker.state)
+        self.assertEqual(10, len(self.server.received))
+
+        # fail fast while the circuit is open
+        with self.assertRaises(CircuitOpenError):
+            self.new_orchestra().request('GET', 'bill-list', raise_exception=False)
+        self.assertEqual(10, len(self.server.received))
+
+        # a request is sent after the cooldown and closes the circuit
+        breaker.opened_at -= breaker.cooldown
+        self.server.failures = 0
+        status, _ = self.new_orchestra().request('GET', 'bill-list')
+        self.assertEqual(200, status)
+        self.assertEqual(breaker.CLOSED, breaker.state)
+
+
+class LazyServiceListTest(StubOrchestraMixin, TestCase):
+    ROWS = [{'name': 'saas{}'.format(i), 'service': 'gitlab'} for i in range(45)]
+
+    def test_page_is_forwarded_to_backend(self):
+        self.server.responses['/api/saas/?page=3&per_page=20'] = {
+            'count': 45, 'next': None, 'previous': None, 'results': self.ROWS[40:],
+        }
+        services = self.orchestra.retrieve_lazy_service_list(SaasService, page=3, per_page=20)
+        page = Paginator(services, 20).page(3)
+
+        self.assertEqual(45, page.paginator.count)
+        self.assertEqual(['saas40', 'saas41', 'saas42', 'saas43', 'saas44'], [s.name for s in page])
+        self.assertEqual(1, len(self.server.received))
+
+    def test_backend_without_pagination(self):
+        self.server.responses['/api/saas/?page=1&per_page=20'] = self.ROWS
+        services = self.orchestra.retrieve_lazy_service_list(SaasService, per_page=20)
+        page = Paginator(services, 20).page(2)
+
+        self.assertEqual(45, page.paginator.count)
+        self.assertEqual('saas20', page[0].name)
+        self.assertEqual(20, len(page))
+        self.assertEqual(1, len(self.server.received))
+
+    def test_pages_are_not_requested_if_ignored(self):
+        rows = [{'id': i, 'name': 'mailbox{}'.format(i)} for i in range(5)]
+        self.server.responses['/api/mailboxes/?page=1&per_page=2'] = rows
+        self.server.responses['/api/mailboxes/'] = rows
+
+        first = self.orchestra.retrieve_lazy_service_list(Mailbox, page=1, per_page=2)
+        self.assertEqual(5, Paginator(first, 2).page(1).paginator.count)
+
+        orchestra = Orchestra(auth_token='fake-token', base_url=self.base_url)
+        second = orchestra.retrieve_lazy_service_list(Mailbox, page=2, per_page=2)
+        self.assertEqual(['mailbox2', 'mailbox3'], [m.name for m in Paginator(second, 2).page(2)])
+        orchestra.retrieve_service_list(Mailbox.api_name)
+
+        # the list of the first request is reused
+        self.assertEqual(['/api/mailboxes/?page=1&per_page=2'], [path for path, _ in self.server.received])
+
+    def test_page_out_of_range(self):
+        self.server.responses['/api/saas/?page=1&per_page=20'] = {
+            'count': 45, 'next': None, 'previous': None, 'results': self.ROWS[:20],
+        }
+        self.server.responses['/api/saas/?page=9&per_page=20'] = {'detail': 'Invalid page.'}
+        self.server.statuses['/api/saas/?page=9&per_page=20'] = 404
+        self.login()
+
+        response = self.client.get('/saas/?page=9')
+
+        self.assertEqual(404, response.status_code)
+
+
+class BillingViewTest(StubOrchestraMixin, TestCase):
+    def test_bills_are_sorted_by_backend(self):
+        self.server.responses['/api/bills/?ordering=-created_on&page=2&per_page=20'] = {
+            'count': 21, 'next': None, 'previous': None,
+            'results': [{'id': 1, 'number': 'F000001', 'created_on': '2020-01-02'}],
+        }
+        self.login()
+
+        response = self.client.get('/billing/?page=2')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(21, response.context['paginator'].count)
+        bill = response.context['object_list'][0]
+        self.assertEqual(('F000001', date(2020, 1, 2)), (bill.number, bill.created_on))
+        paths = [path for path, _ in self.server.received if path.startswith('/api/bills/')]
+        self.assertEqual(['/api/bills/?ordering=-created_on&page=2&per_page=20'], paths)
+
+    def test_bills_are_sorted_if_backend_does_not(self):
+        self.server.responses['/api/bills/?ordering=-created_on&page=1&per_page=20'] = [
+            {'id': 1, 'number': 'F000001', 'created_on': '2020-01-02'},
+            {'id': 2, 'number': 'F000002', 'created_on': '2020-03-01'},
+            {'id': 3, 'number': 'F000003', 'created_on': '2020-02-01'},
+        ]
+        self.login()
+
+        response = self.client.get('/billing/')
+
+        numbers = [bill.number for bill in response.context['object_list']]
+        self.assertEqual(['F000002', 'F000003', 'F000001'], numbers)
+
+
+class BillDownloadTest(StubOrchestraMixin, TestCase):
+    def test_document_is_streamed(self):
+        document = b'%PDF-1.4' + b'0' * 200 * 1024
+        self.server.responses['/api/bills/1/document/'] = document
+        self.login()
+
+        response = self.client.get('/bills/1/download/')
+
+        self.assertTrue(response.streaming)
+        self.assertEqual('application/pdf', response['Content-Type'])
+        self.assertEqual(str(len(document)), response['Content-Length'])
+        self.assertIn('bill-1.pdf', response['Content-Disposition'])
+        self.assertEqual(document, b''.join(response.streaming_content))
+
+
+class BillDocumentStoreTest(StubOrchestraMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.store = BillDocumentStore(tmp_dir.name, max_size=1024)
+        patcher = mock.patch('musician.views.get_bill_store', return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_document_is_stored(self):
+        self.server.responses['/api/bills/1/document/'] = b'%PDF-1.4 bill 1'
+        self.login()
+
+        for _ in range(2):
+            response = self.client.get('/bills/1/download/')
+            self.assertEqual(b'%PDF-1.4 bill 1', b''.join(response.streaming_content))
+            self.assertEqual('application/pdf', response['Content-Type'])
+
+        document_requests = [path for path, _ in self.server.received if path.startswith('/api/bills/')]
+        self.assertEqual(1, len(document_requests))
+
+    def test_documents_are_scoped_by_account(self):
+        list(self.store.save('pepe', 2, [b'%PDF-1.4 bill 2'], {}))
+
+        self.assertIsNone(self.store.open('other', 2))
+        document, _ = self.store.open('pepe', 2)
+        document.close()
+
+    def test_least_recently_used_is_evicted(self):
+        list(self.store.save('pepe', 1, [b'1' * 600], {}))
+        list(self.store.save('pepe', 2, [b'2' * 600], {}))
+
+        self.assertIsNone(self.store.open('pepe', 1))
+        document, _ = self.store.open('pepe', 2)
+        document.close()
+
+
+class MailFormChoicesTest(StubOrchestraMixin, TestCase):
+    def test_create_form_requests_only_choices(self):
+        self.server.responses['/api/domains/'] = [
+            {'id': 1, 'name': 'example.org', 'url': 'https://example.org/api/domains/1/'},
+        ]
+        self.server.responses['/api/mailboxes/'] = [
+            {'id': 2, 'name': 'pepe', 'url': 'https://example.org/api/mailboxes/2/'},
+        ]
+        self.login()
+
+        response = self.client.get('/address/new/')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            [('https://example.org/api/domains/1/', 'example.org')],
+            response.context['form'].fields['domain'].choices,
+        )
+        paths = sorted(path for path, _ in self.server.received)
+        self.assertEqual(['/api/accounts/', '/api/domains/', '/api/mailboxes/'], paths)
+
+
+@override_settings(MANAGERS=[('Manager', 'manager@example.org')])
+class SendNotificationsTest(TestCase):
+    def setUp(self):
+        self.notification = ManagerNotification.objects.create(subject='Mailbox deleted', message='Details')
+
+    def test_notifications_are_sent(self):
+        call_command('sendnotifications', stdout=mock.Mock())
+
+        self.notification.refresh_from_db()
+        self.assertIsNotNone(self.notification.sent_at)
+        self.assertEqual(1, len(mail.outbox))
+        self.assertIn('Mailbox deleted', mail.outbox[0].subject)
+
+    def test_failed_notification_is_retried_later(self):
+        with mock.patch('musician.management.commands.sendnotifications.mail_managers',
+                        side_effect=smtplib.SMTPException('timeout')):
+            call_command('sendnotifications', stdout=mock.Mock())
+
+        self.notification.refresh_from_db()
+        self.assertIsNone(self.notification.sent_at)
+        self.assertEqual(1, self.notification.attempts)
+        self.assertEqual('timeout', self.notification.last_error)
+
+        # not sent again until the retry delay is over
+        call_command('sendnotifications', stdout=mock.Mock())
+        self.assertEqual(0, len(mail.outbox))
+
+    def test_claimed_notifications_are_not_sent_by_other_workers(self):
+        claimed = SendNotificationsCommand().claim_batch(10)
+        self.assertEqual([self.notification], claimed)
+
+        call_command('sendnotifications', stdout=mock.Mock())
+        self.assertEqual(0, len(mail.outbox))
+
+    def test_sent_notifications_are_purged(self):
+        old = ManagerNotification.objects.create(
+            subject='Old', message='', sent_at=timezone.now() - timedelta(days=31))
+        recent = ManagerNotification.objects.create(
+            subject='Recent', message='', sent_at=timezone.now() - timedelta(days=1))
+
+        call_command('sendnotifications', stdout=mock.Mock())
+
+        remaining = set(ManagerNotification.objects.values_list('pk', flat=True))
+        self.assertEqual({self.notification.pk, recent.pk}, remaining)
+        self.assertNotIn(old.pk, remaining)
+
+
+class RequestMemoizationTest(StubOrchestraMixin, TestCase):
+    def test_identical_requests_are_sent_once(self):
+        self.orchestra.request('GET', 'bill-list')
+        self.orchestra.request('GET', 'bill-list')
+
+        self.assertEqual({'requests': 1, 'memoized': 1}, self.orchestra.stats)
+        self.assertEqual(1, len(self.server.received))
+
+    def test_errors_are_not_memoized(self):
+        self.server.statuses['/api/bills/'] = 404
+        status, _ = self.orchestra.request('GET', 'bill-list', raise_exception=False)
+        self.assertEqual(404, status)
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.orchestra.request('GET', 'bill-list')
+
+    def test_write_discards_memoized_responses(self):
+        self.orchestra.request('GET', 'bill-list')
+        with mock.patch.object(self.orchestra, 'send', return_value=(200, {})):
+            self.orchestra.request('PATCH', url=self.base_url + 'mailboxes/1/')
+        self.orchestra.request('GET', 'bill-list')
+
+        self.assertEqual(2, len(self.server.received))
+
+
+class ViewRequestsBudgetTest(StubOrchestraMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.responses.update({
+            '/api/domains/': [{'id': 1, 'name': 'example.org', 'url': 'https://example.org/api/domains/1/'}],
+            '/api/mailboxes/1/': {'id': 1, 'name': 'pepe', 'addresses': []},
+        })
+        self.login()
+
+    def assertMaxRequests(self, max_requests, path):
+        response = self.client.get(path)
+        self.assertEqual(200, response.status_code)
+        self.assertLessEqual(response.context['view'].orchestra.stats['requests'], max_requests)
+
+    def test_dashboard(self):
+        # profile (panels are loaded afterwards)
+        self.assertMaxRequests(1, '/dashboard/')
+
+    def test_dashboard_panels(self):
+        # profile, domains, websites and addresses
+        self.assertMaxRequests(4, '/dashboard/panels/domains/')
+        # profile, mailboxes, databases and addresses
+        self.assertMaxRequests(4, '/dashboard/panels/usage/')
+
+    def test_address_list(self):
+        self.server.responses['/api/addresses/?page=2&per_page=20'] = {
+            'count': 21, 'results': [{'id': 21, 'name': 'info', 'domain': {'name': 'example.org'}}],
+        }
+        # profile and the page of addresses
+        self.assertMaxRequests(2, '/address/?page=2')
+        paths = [path for path, _ in self.server.received]
+        self.assertIn('/api/addresses/?page=2&per_page=20', paths)
+        self.assertNotIn('/api/mailboxes/', paths)
+
+    def test_mailbox_change_password(self):
+        # profile and mailbox
+        self.assertMaxRequests(2, '/mailboxes/1/change-password/')
+
+
+class DashboardSnapshotTest(StubOrchestraMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.responses['/api/domains/'] = [{'id': 1, 'name': 'example.org', 'url': 'https://example.org/api/domains/1/'}]
+        self.login()
+
+    def get_snapshot(self):
+        return get_cache().get(make_snapshot_key(self.orchestra.auth_token))
+
+    def test_snapshot_is_reused(self):
+        self.client.get('/dashboard/panels/domains/')
+        with mock.patch('musician.api.Orchestra.retrieve_domain_list') as retrieve_domain_list:
+            response = self.client.get('/dashboard/panels/domains/')
+
+        self.assertContains(response, 'example.org')
+        self.assertFalse(retrieve_domain_list.called)
+
+    def test_stale_snapshot_is_refreshed_in_background(self):
+        self.client.get('/dashboard/panels/domains/')
+        snapshot = self.get_snapshot()
+        snapshot['created_at'] -= timedelta(seconds=musician_settings.DASHBOARD_SNAPSHOT_SOFT_TTL + 1)
+        get_cache().set(make_snapshot_key(self.orchestra.auth_token), snapshot)
+        self.server.responses['/api/domains/'][0]['name'] = 'example.net'
+
+        futures = []
+        def refresh(orchestra):
+            futures.append(refresh_in_background(orchestra))
+            return futures[-1]
+
+        with mock.patch('musician.snapshots.refresh_in_background', refresh):
+            response = self.client.get('/dashboard/panels/domains/')
+        self.assertContains(response, 'example.org')
+
+        futures[0].result()
+        self.assertEqual('example.net', self.get_snapshot()['domains'][0].name)
+
+    def test_refresh_action(self):
+        self.client.get('/dashboard/panels/domains/')
+        self.server.responses['/api/domains/'][0]['name'] = 'example.net'
+
+        response = self.client.post('/dashboard/refresh/')
+        self.assertRedirects(response, '/dashboard/', fetch_redirect_response=False)
+        self.assertEqual('example.net', self.get_snapshot()['domains'][0].name)
+
+    def test_snapshot_does_not_invalidate_cached_lists(self):
+        self.orchestra.retrieve_service_list(Address.api_name)
+        self.orchestra.retrieve_service_list(Domain.api_name)
+        self.server.responses['/api/domains/'][0]['name'] = 'example.net'
+
+        self.client.get('/dashboard/panels/domains/')
+
+        # the snapshot is built from the API and the lists cached are kept (and refreshed)
+        self.assertEqual('example.net', self.get_snapshot()['domains'][0].name)
+        self.assertEqual(0, get_cache().get(make_token_key(self.orchestra.auth_token, 'address', 'version'), 0))
+        self.server.received.clear()
+        self.orchestra.responses.clear()
+        self.orchestra.retrieve_service_list(Address.api_name)
+        self.assertEqual([], self.server.received)
+
+    def test_write_during_build_discards_snapshot(self):
+        retrieve_domain_list = self.orchestra.retrieve_domain_list
+
+        def write_meanwhile(**kwargs):
+            domains = retrieve_domain_list(**kwargs)
+            self.orchestra.invalidate_cache('address')
+            return domains
+
+        with mock.patch.object(self.orchestra, 'retrieve_domain_list', write_meanwhile):
+            snapshot = build_dashboard_snapshot(self.orchestra)
+
+        self.assertEqual('example.org', snapshot['domains'][0].name)
+        self.assertIsNone(self.get_snapshot())
+
+    def test_shell_does_not_wait_for_panels(self):
+        with mock.patch('musician.api.Orchestra.retrieve_domain_list') as retrieve_domain_list:
+            response = self.client.get('/dashboard/')
+
+        self.assertContains(response, 'data-panel-url="/dashboard/panels/domains/"')
+        self.assertContains(response, 'data-panel-url="/dashboard/panels/usage/"')
+        self.assertFalse(retrieve_domain_list.called)
+
+    def test_usage_panel(self):
+        self.server.responses['/api/mailboxes/'] = [{'id': 1}, {'id': 2}, {'id': 3}]
+        response = self.client.get('/dashboard/panels/usage/')
+
+        self.assertContains(response, '3 mailboxes')
+        self.assertContains(response, '1 extra mailboxes')
+
+    def test_write_forgets_snapshot(self):
+        self.client.get('/dashboard/panels/domains/')
+        self.orchestra.invalidate_cache('address')
+
+        self.assertIsNone(self.get_snapshot())
+
+
+class CacheFragmentTest(TestCase):
+    TEMPLATE = Template("{% load musician %}{% cache_fragment 'row' obj %}{{ obj.name }}{% endcache_fragment %}")
+
+    def setUp(self):
+        get_cache().clear()
+
+    def render(self, obj):
+        return self.TEMPLATE.render(Context({'obj': obj}))
+
+    def test_fragment_is_reused(self):
+        self.assertEqual('pepe', self.render(Mailbox.new_from_json({'id': 1, 'name': 'pepe'})))
+
+        # the JSON is the same: the fragment isn't rendered again
+        mailbox = Mailbox.new_from_json({'id': 1, 'name': 'pepe'})
+        mailbox.name = 'juan'
+        self.assertEqual('pepe', self.render(mailbox))
+
+    def test_fragment_is_rendered_when_data_changes(self):
+        self.render(Mailbox.new_from_json({'id': 1, 'name': 'pepe'}))
+
+        self.assertEqual('juan', self.render(Mailbox.new_from_json({'id': 1, 'name': 'juan'})))
+        self.assertEqual('pepe', self.render(Mailbox.new_from_json({'id': 2, 'name': 'pepe'})))
+
+    def test_fragments_retrieved_by_the_view(self):
+        mailboxes = Mailbox.new_list_from_json([{'id': 1, 'name': 'pepe'}, {'id': 2, 'name': 'juan'}])
+        self.render(mailboxes[0])
+
+        cached_fragments = {'row': get_cached_fragments('row', mailboxes)}
+        self.assertEqual(1, len(cached_fragments['row']))
+        with mock.patch.object(get_cache(), 'get', side_effect=AssertionError) as get:
+            context = Context({'obj': mailboxes[0], 'cached_fragments': cached_fragments})
+            self.assertEqual('pepe', self.TEMPLATE.render(context))
+            context = Context({'obj': mailboxes[1], 'cached_fragments': cached_fragments})
+            self.assertEqual('juan', self.TEMPLATE.render(context))
+        get.assert_not_called()
+
+    def test_nested_objects_change_version(self):
+        website = WebSite.new_from_json({'id': 1, 'contents': []})
+        domain = Domain.new_from_json({'id': 1, 'websites': [website]})
+        changed = Domain.new_from_json({'id': 1, 'websites': [WebSite.new_from_json({'id': 1, 'contents': ['/']})]})
+
+        self.assertNotEqual(domain.cache_version, changed.cache_version)
+
+
+class APIMetricsTest(StubOrchestraMixin, TestCase):
+    def test_path_name_is_resolved(self):
+        self.assertEqual('domain-list', self.orchestra.resolve_path_name(self.base_url + 'domains/?page=1'))
+        self.assertEqual('mailbox-password', self.orchestra.resolve_path_name(self.base_url + 'mailboxes/3/set_password/'))
+
+    @override_settings(DEBUG=True)
+    def test_metrics_by_view(self):
+        self.login()
+        with self.assertLogs('musician.metrics', level='INFO') as logs:
+            response = self.client.get('/dashboard/panels/domains/')
+
+        summary = json.loads(logs.records[0].getMessage())
+        self.assertEqual('musician:dashboard-domains-panel', summary['view'])
+        self.assertEqual(4, summary['api_calls'])
+        self.assertEqual(1, summary['api_paths']['domain-list']['calls'])
+        self.assertEqual({'200': 1}, summary['api_paths']['domain-list']['statuses'])
+        self.assertIn('api-domain-list;dur=', response['Server-Timing'])
+        self.assertEqual(os.getpid(), summary['pool']['pid'])
+        self.assertGreaterEqual(summary['pool']['requests'], summary['api_calls'])
+
+    def test_latency_histograms_are_logged(self):
+        self.login()
+        with mock.patch('musician.settings.METRICS_REPORT_INTERVAL', 0):
+            with self.assertLogs('musician.metrics', level='INFO') as logs:
+                self.client.get('/dashboard/panels/domains/')
+
+        report = json.loads(logs.records[1].getMessage())
+        self.assertEqual(os.getpid(), report['pid'])
+        domains = report['latency_ms']['domain-list']
+        self.assertEqual(get_latency_histograms()['domain-list'], list(domains.values()))
+        self.assertIn('+Inf', domains)
+
+
+class HealthCheckTest(TestCase):
+    def test_health(self):
+        with mock.patch('musician.api.Orchestra.send') as send:
+            response = self.client.get('/healthz/', HTTP_HOST='10.0.0.1')
+        self.assertEqual(200, response.status_code)
+        self.assertFalse(send.called)
+
+    def test_ready(self):
+        response = self.client.get('/readyz/', HTTP_HOST='10.0.0.1')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({'database': True, 'cache': True}, response.json()['checks'])
+
+    def test_not_ready_without_database(self):
+        with mock.patch('musician.middleware.connection.cursor', side_effect=DatabaseError):
+            response = self.client.get('/readyz/')
+        self.assertEqual(503, response.status_code)
+        self.assertFalse(response.json()['checks']['database'])
+
 
 class UserAccountTest(TestCase):
     def test_user_never_logged(self):
@@ -116,6 +1079,94 @@ class UserAccountTest(TestCase):
         self.assertIsNotNone(account.billing)
 
 
+class ResourceUsageTest(TestCase):
+    def test_resource_usage(self):
+        rows = [
+            {'resources': [{'name': 'disk', 'used': '1', 'allocated': '4', 'unit': 'MiB'}]},
+            {'resources': [{'name': 'disk', 'used': 'unknown', 'allocated': '4', 'unit': 'MiB'}]},
+            {'resources': []},
+            {},
+        ]
+        usage = [get_resource_usage(row.get('resources')) for row in rows]
+
+        self.assertEqual([{'usage': 1.0, 'total': '4', 'unit': 'MiB', 'percent': 25}, {}, {}, {}], usage)
+
+    def test_usage_is_attached_to_list(self):
+        rows = [
+            {'id': 1, 'name': 'a', 'resources': [{'name': 'disk', 'used': '2', 'allocated': '2', 'unit': 'GiB'}]},
+            {'id': 2, 'name': 'b'},
+        ]
+        mailboxes = Mailbox.new_list_from_json(rows)
+
+        self.assertEqual(100, mailboxes[0].usage['percent'])
+        self.assertEqual({}, mailboxes[1].usage)
+
+
+class AccountUsageTest(StubOrchestraMixin, TestCase):
+    def test_aggregate_usage(self):
+        mailboxes = [
+            {'resources': [{'name': 'disk', 'used': '512', 'allocated': '1024', 'unit': 'MiB'}]},
+            {'resources': [{'name': 'disk', 'used': '1', 'allocated': '2', 'unit': 'GiB'}]},
+        ]
+        databases = [{'resources': [{'name': 'disk', 'used': '0.5', 'allocated': '1', 'unit': 'GiB'}]}]
+
+        totals = aggregate_usage(mailboxes, databases, addresses=[{}, {}, {}])
+
+        self.assertEqual({'used': 2048, 'allocated': 4096}, totals['disk'])
+        self.assertEqual((2, 1, 3), (totals['mailboxes'], totals['databases'], totals['addresses']))
+
+    def test_unknown_allocation(self):
+        totals = aggregate_usage([{'resources': []}, {}], [], [])
+        self.assertEqual({'used': 0, 'allocated': None}, totals['disk'])
+
+    def test_usage_endpoint(self):
+        self.server.responses['/api/mailboxes/'] = [
+            {'id': 1, 'resources': [{'name': 'disk', 'used': '1', 'allocated': '2', 'unit': 'GiB'}]},
+            {'id': 2, 'resources': [{'name': 'disk', 'used': '1', 'allocated': '2', 'unit': 'GiB'}]},
+        ]
+        self.login()
+
+        response = self.client.get('/dashboard/usage/')
+        self.assertEqual(200, response.status_code)
+        usage = response.json()
+        self.assertEqual({'usage': 2, 'total': 4, 'unit': 'GiB', 'percent': 50}, usage['disk']['data'])
+        self.assertEqual(2, usage['mailbox']['data']['usage'])
+
+        # totals are cached by account
+        self.server.received.clear()
+        self.client.get('/dashboard/usage/')
+        self.assertNotIn('/api/mailboxes/', [path for path, _ in self.server.received])
+
+    def test_write_discards_usage(self):
+        self.login()
+        self.client.get('/dashboard/usage/')
+        self.orchestra.invalidate_cache(Mailbox.api_name)
+        self.assertIsNone(get_cache().get(make_usage_key(self.orchestra.auth_token)))
+
+    def test_usage_endpoint_requires_login(self):
+        response = self.client.get('/dashboard/usage/')
+        self.assertEqual(403, response.status_code)
+
+
+class SharedCacheCheckTest(TestCase):
+    def test_local_memory_cache_is_reported(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual(['musician.W001'], [error.id for error in check_shared_cache(None)])
+
+    def test_shared_cache(self):
+        self.assertEqual([], check_shared_cache(None))
+
+
+class GetSettingTest(TestCase):
+    @override_settings(API_RETRIES=0)
+    def test_falsy_value_is_kept(self):
+        self.assertEqual(0, musician_settings.getsetting('API_RETRIES'))
+
+    def test_default_value(self):
+        self.assertEqual(2, musician_settings.getsetting('API_RETRIES'))
+
+
 class GetBootstrapedPercentTest(TestCase):
     BS_WIDTH = [0, 25, 50, 100]
 
@@ -15,6 +15,10 @@ urlpatterns = [
     path('auth/login/', views.LoginView.as_view(), name='login'),
     path('auth/logout/', views.LogoutView.as_view(), name='logout'),
     path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
+    path('dashboard/refresh/', views.DashboardRefreshView.as_view(), name='dashboard-refresh'),
+    path('dashboard/usage/', views.DashboardUsageView.as_view(), name='dashboard-usage'),
+    path('dashboard/panels/usage/', views.DashboardUsagePanelView.as_view(), name='dashboard-usage-panel'),
+    path('dashboard/panels/domains/', views.DashboardDomainsPanelView.as_view(), name='dashboard-domains-panel'),
     path('domains/<int:pk>/', views.DomainDetailView.as_view(), name='domain-detail'),
     path('billing/', views.BillingView.as_view(), name='billing'),
     path('bills/<int:pk>/download/', views.BillDownloadView.as_view(), name='bill-download'),
@@ -0,0 +1,156 @@
+"""
+Account-wide usage of the resources shown on the dashboard.
+
+Totals are aggregated from the resources already included by the API on
+the lists of services (in a single pass over every list) and cached by
+account during USAGE_CACHE_TTL seconds (or until a write operation).
+"""
+from functools import partial
+
+from django.utils.html import format_html
+from django.utils.translation import gettext_lazy as _
+
+from . import settings as musician_settings
+from .cache import get_cache, make_token_key
+from .models import Address, DatabaseService, Mailbox
+from .utils import get_bootstraped_percent, get_resource_usage
+
+
+# size of the units of the resources in MiB
+UNITS = {
+    'B': 1 / 1024 ** 2,
+    'KB': 1000 / 1024 ** 2,
+    'KiB': 1 / 1024,
+    'MB': 1000 ** 2 / 1024 ** 2,
+    'MiB': 1,
+    'GB': 1000 ** 3 / 1024 ** 2,
+    'GiB': 1024,
+    'TB': 1000 ** 4 / 1024 ** 2,
+    'TiB': 1024 ** 2,
+}
+
+
+def make_usage_key(token):
+    return make_token_key(token, 'usage')
+
+
+def to_mib(value, unit):
+    """Convert a size to MiB (None if the unit is unknown)."""
+    try:
+        return float(value) * UNITS[unit]
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def sum_disk_usage(rows, get_resources):
+    """
+    Returns:
+      A tuple (used, allocated) in MiB of the disk of the rows. Allocated
+      is None if it's unknown for any of them.
+    """
+    used, allocated = 0, 0
+    for row in rows:
+        usage = get_resource_usage(get_resources(row))
+        if not usage:
+            allocated = None
+            continue
+        used += to_mib(usage['usage'], usage['unit']) or 0
+        row_allocated = to_mib(usage['total'], usage['unit'])
+        allocated = None if allocated is None or row_allocated is None else allocated + row_allocated
+    return used, allocated
+
+
+def aggregate_usage(mailboxes, databases, addresses):
+    """Compute the totals of an account from the JSON of its services."""
+    mailboxes_used, mailboxes_allocated = sum_disk_usage(mailboxes, Mailbox.get_resources)
+    databases_used, databases_allocated = sum_disk_usage(databases, DatabaseService.get_resources)
+
+    allocated = None
+    if mailboxes_allocated is not None and databases_allocated is not None:
+        allocated = mailboxes_allocated + databases_allocated
+
+    return {
+        'disk': {'used': mailboxes_used + databases_used, 'allocated': allocated},
+        'mailboxes': len(mailboxes),
+        'databases': len(databases),
+        'addresses': len(addresses),
+    }
+
+
+def compute_account_usage(orchestra):
+    lists = orchestra.gather(
+        mailboxes=partial(orchestra.retrieve_service_list, Mailbox.api_name),
+        databases=partial(orchestra.retrieve_service_list, DatabaseService.api_name),
+        addresses=partial(orchestra.retrieve_service_list, Address.api_name),
+    )
+    return aggregate_usage(**lists)
+
+
+def get_account_usage(orchestra):
+    """Return the usage totals of the account (see `aggregate_usage`)."""
+    totals = get_cache().get(make_usage_key(orchestra.auth_token))
+    if totals is None:
+        totals = compute_account_usage(orchestra)
+        store_account_usage(orchestra.auth_token, totals)
+    return totals
+
+
+def store_account_usage(token, totals):
+    get_cache().set(make_usage_key(token), totals, musician_settings.USAGE_CACHE_TTL)
+
+
+def forget_account_usage(token):
+    get_cache().delete(make_usage_key(token))
+
+
+def format_disk_usage(used, allocated):
+    """Usage details (see `utils.get_resource_usage`) of sizes in MiB."""
+    unit, size = 'MiB', 1
+    if max(used, allocated or 0) >= 1024:
+        unit, size = 'GiB', 1024
+    return {
+        'usage': round(used / size, 2),
+        'total': None if allocated is None else round(allocated / size, 2),
+        'unit': unit,
+        'percent': get_bootstraped_percent(used, allocated),
+    }
+
+
+def get_resource_usage_cards(totals, profile_type):
+    """Build the resource usage cards of the dashboard based on the plan of the account."""
+    allowed = musician_settings.ALLOWED_RESOURCES[profile_type]
+
+    disk = totals['disk']
+    allowed_disk = allowed.get('disk', disk['allocated'])
+
+    allowed_mailboxes = allowed['mailbox']
+    total_mailboxes = totals['mailboxes']
+    mailboxes_left = allowed_mailboxes - total_mailboxes
+
+    alert = ''
+    if mailboxes_left < 0:
+        alert = format_html("<span class='text-danger'>{} extra mailboxes</span>", mailboxes_left * -1)
+    elif mailboxes_left <= 1:
+        alert = format_html("<span class='text-warning'>{} mailbox left</span>", mailboxes_left)
+
+    return {
+        'disk': {
+            'verbose_name': _('Disk usage'),
+            'data': format_disk_usage(disk['used'], allowed_disk),
+        },
+        'traffic': {
+            'verbose_name': _('Traffic'),
+            # TODO(@slamora) update when backend provides traffic data
+            'data': {},
+        },
+        'mailbox': {
+            'verbose_name': _('Mailbox usage'),
+            'data': {
+                'usage': total_mailboxes,
+                'total': allowed_mailboxes,
+                'alert': alert,
+                'unit': 'mailboxes',
+                'percent': get_bootstraped_percent(total_mailboxes, allowed_mailboxes),
+            },
+        },
+    }
@@ -16,3 +16,36 @@ def get_bootstraped_percent(value, total):
     bootstraped = min(100, bootstraped)
 
     return bootstraped
+
+
+def get_resource_usage(resources, name='disk'):
+    """
+    Get usage details of the resource `name` from the `resources` list
+    returned by the API.
+
+    Returns:
+      A dict with the `usage`, `total`, `unit` and `percent` of the
+      resource or an empty dict if it's not available.
+    """
+    for resource in resources or []:
+        if resource.get('name') != name:
+            continue
+
+        try:
+            usage = float(resource['used'])
+            details = {
+                'usage': usage,
+                'total': resource['allocated'],
+                'unit': resource['unit'],
+            }
+        except (KeyError, TypeError, ValueError):
+            return {}
+
+        try:
+            total = float(details['total'])
+        except (TypeError, ValueError):
+            total = None
+        details['percent'] = get_bootstraped_percent(usage, total)
+        return details
+
+    return {}
@@ -1,15 +1,13 @@
 import logging
-import smtplib
-import datetime
+from functools import partial
 
 from django.conf import settings
 from django.contrib import messages
 from django.core.exceptions import ImproperlyConfigured
-from django.core.mail import mail_managers
-from django.http import HttpResponse, HttpResponseNotFound, HttpResponseRedirect
+from django.http import (FileResponse, HttpResponseNotFound, HttpResponseRedirect, JsonResponse,
+                         StreamingHttpResponse)
 from django.urls import reverse_lazy
 from django.utils import translation
-from django.utils.html import format_html
 from django.utils.http import is_safe_url
 from django.utils.translation import gettext_lazy as _
 from django.views import View
@@ -22,86 +20,92 @@ from requests.exceptions import HTTPError
 from . import get_version
 from .auth import login as auth_login
 from .auth import logout as auth_logout
+from .cache import get_cached_fragments
 from .forms import LoginForm, MailboxChangePasswordForm, MailboxCreateForm, MailboxUpdateForm, MailForm
 from .mixins import (CustomContextMixin, ExtendedPaginationMixin,
                      UserTokenRequiredMixin)
-from .models import (Address, Bill, DatabaseService, Mailbox,
+from .models import (Address, Bill, DatabaseService, Mailbox, ManagerNotification,
                      MailinglistService, PaymentSource, SaasService)
-from .settings import ALLOWED_RESOURCES
-from .utils import get_bootstraped_percent
+from .snapshots import build_dashboard_snapshot, get_dashboard_snapshot
+from .storage import get_bill_store
+from .usage import get_account_usage, get_resource_usage_cards
 
 logger = logging.getLogger(__name__)
 
 
 class DashboardView(CustomContextMixin, UserTokenRequiredMixin, TemplateView):
+    """
+    Shell of the dashboard: its panels are loaded afterwards (see
+    `DashboardUsagePanelView` and `DashboardDomainsPanelView`), so the page
+    is shown without waiting for the API.
+    """
     template_name = "musician/dashboard.html"
     extra_context = {
         # Translators: This message appears on the page title
         'title': _('Dashboard'),
     }
 
+
+class DashboardUsagePanelView(UserTokenRequiredMixin, TemplateView):
+    """Resource usage cards of the dashboard (HTML fragment)."""
+    template_name = "musician/components/dashboard_usage.html"
+    raise_exception = True
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        domains = self.orchestra.retrieve_domain_list()
 
         # TODO(@slamora) update when backend supports notifications
         notifications = []
 
         # show resource usage based on plan definition
         profile_type = context['profile'].type
-
-        # TODO(@slamora) update when backend provides resource usage data
-        resource_usage = {
-            'disk': {
-                'verbose_name': _('Disk usage'),
-                'data': {
-                    # 'usage': 534,
-                    # 'total': 1024,
-                    # 'unit': 'MB',
-                    # 'percent': 50,
-                },
-            },
-            'traffic': {
-                'verbose_name': _('Traffic'),
-                'data': {
-                    # 'usage': 300,
-                    # 'total': 2048,
-                    # 'unit': 'MB/month',
-                    # 'percent': 25,
-                },
-            },
-            'mailbox': self.get_mailbox_usage(profile_type),
-        }
+        resource_usage = get_resource_usage_cards(get_account_usage(self.orchestra), profile_type)
 
         context.update({
-            'domains': domains,
             'resource_usage': resource_usage,
             'notifications': notifications,
         })
 
         return context
 
-    def get_mailbox_usage(self, profile_type):
-        allowed_mailboxes = ALLOWED_RESOURCES[profile_type]['mailbox']
-        total_mailboxes = len(self.orchestra.retrieve_mailbox_list())
-        mailboxes_left = allowed_mailboxes - total_mailboxes
-
-        alert = ''
-        if mailboxes_left < 0:
-            alert = format_html("<span class='text-danger'>{} extra mailboxes</span>", mailboxes_left * -1)
-        elif mailboxes_left <= 1:
-            alert = format_html("<span class='text-warning'>{} mailbox left</span>", mailboxes_left)
-
-        return {
-            'verbose_name': _('Mailbox usage'),
-            'data': {
-                'usage': total_mailboxes,
-                'total': allowed_mailboxes,
-                'alert': alert,
-                'unit': 'mailboxes',
-                'percent': get_bootstraped_percent(total_mailboxes, allowed_mailboxes),
+
+class DashboardDomainsPanelView(UserTokenRequiredMixin, TemplateView):
+    """Domain cards of the dashboard (HTML fragment)."""
+    template_name = "musician/components/dashboard_domains.html"
+    raise_exception = True
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        snapshot = get_dashboard_snapshot(self.orchestra)
+        context.update({
+            'domains': snapshot['domains'],
+            'updated_at': snapshot['created_at'],
+            'cached_fragments': {
+                'domain-card': get_cached_fragments('domain-card', snapshot['domains']),
             },
-        }
+        })
+        return context
+
+
+class DashboardUsageView(UserTokenRequiredMixin, View):
+    """Resource usage of the account as JSON (to load the dashboard cards asynchronously)."""
+    raise_exception = True
+
+    def get(self, request, *args, **kwargs):
+        profile_type = self.orchestra.retrieve_profile().type
+        cards = get_resource_usage_cards(get_account_usage(self.orchestra), profile_type)
+        return JsonResponse({
+            name: {'verbose_name': str(card['verbose_name']), 'data': card['data']}
+            for name, card in cards.items()
+        })
+
+
+class DashboardRefreshView(UserTokenRequiredMixin, View):
+    """Rebuild the dashboard snapshot of the user (e.g. after changes made elsewhere)."""
+
+    def post(self, request, *args, **kwargs):
+        build_dashboard_snapshot(self.orchestra)
+        return HttpResponseRedirect(reverse_lazy('musician:dashboard'))
 
 
 class ProfileView(CustomContextMixin, UserTokenRequiredMixin, TemplateView):
@@ -146,6 +150,8 @@ class ServiceListView(CustomContextMixin, ExtendedPaginationMixin, UserTokenRequ
     """Base list view to all services"""
     service_class = None
     template_name = "musician/service_list.html"
+    # name of the `cache_fragment` rendering each object (if any)
+    fragment_name = None
 
     def get_queryset(self):
         if self.service_class is None or self.service_class.api_name is None:
@@ -153,11 +159,18 @@ class ServiceListView(CustomContextMixin, ExtendedPaginationMixin, UserTokenRequ
                 "ServiceListView requires a definiton of 'service'")
 
         queryfilter = self.get_queryfilter()
-        json_qs = self.orchestra.retrieve_service_list(
-            self.service_class.api_name,
+        try:
+            page = int(self.request.GET.get(self.page_kwarg, 1))
+        except ValueError:
+            page = 1
+
+        return self.orchestra.retrieve_lazy_service_list(
+            self.service_class,
             querystring=queryfilter,
+            page=max(page, 1),
+            per_page=self.get_paginate_by(None),
+            ordering=self.get_ordering(),
         )
-        return [self.service_class.new_from_json(data) for data in json_qs]
 
     def get_queryfilter(self):
         """Does nothing by default. Should be implemented on subclasses"""
@@ -168,6 +181,10 @@ class ServiceListView(CustomContextMixin, ExtendedPaginationMixin, UserTokenRequ
         context.update({
             'service': self.service_class,
         })
+        if self.fragment_name is not None:
+            context['cached_fragments'] = {
+                self.fragment_name: get_cached_fragments(self.fragment_name, context['object_list']),
+            }
         return context
 
 
@@ -178,13 +195,8 @@ class BillingView(ServiceListView):
         # Translators: This message appears on the page title
         'title': _('Billing'),
     }
-
-    def get_queryset(self):
-        qs = super().get_queryset()
-        qs = sorted(qs, key=lambda x: x.created_on, reverse=True)
-        for q in qs:
-            q.created_on = datetime.datetime.strptime(q.created_on, "%Y-%m-%d")
-        return qs
+    # newest bills first
+    ordering = '-created_on'
 
 
 class BillDownloadView(CustomContextMixin, UserTokenRequiredMixin, View):
@@ -193,27 +205,78 @@ class BillDownloadView(CustomContextMixin, UserTokenRequiredMixin, View):
         'title': _('Download bill'),
     }
 
+    chunk_size = 64 * 1024
+
     def get(self, request, *args, **kwargs):
         pk = self.kwargs.get('pk')
-        bill = self.orchestra.retrieve_bill_document(pk)
+        metadata = {
+            'content_type': 'application/pdf',
+            'content_disposition': 'inline; filename="bill-{}.pdf"'.format(pk),
+        }
+
+        # bills are scoped by account so an account only reaches its own documents
+        store = get_bill_store()
+        if store is not None:
+            account = self.orchestra.retrieve_profile().username
+            stored = store.open(account, pk)
+            if stored is not None:
+                document, metadata = stored
+                response = FileResponse(document, content_type=metadata['content_type'])
+                response['Content-Disposition'] = metadata['content_disposition']
+                return response
+
+        document = self.orchestra.stream_bill_document(pk)
+        metadata = {
+            'content_type': document.headers.get('Content-Type', metadata['content_type']),
+            'content_disposition': document.headers.get('Content-Disposition', metadata['content_disposition']),
+        }
+
+        content = self.iter_document(document)
+        if store is not None and document.status_code == 200:
+            content = store.save(account, pk, content, metadata)
+
+        response = StreamingHttpResponse(
+            content,
+            status=document.status_code,
+            content_type=metadata['content_type'],
+        )
+        # content is decoded while streaming so the length is only known if not encoded
+        if 'Content-Length' in document.headers and 'Content-Encoding' not in document.headers:
+            response['Content-Length'] = document.headers['Content-Length']
+        response['Content-Disposition'] = metadata['content_disposition']
 
-        return HttpResponse(bill)
+        return response
+
+    def iter_document(self, document):
+        try:
+            yield from document.iter_content(chunk_size=self.chunk_size)
+        finally:
+            document.close()
 
 
 class MailView(ServiceListView):
     service_class = Address
     template_name = "musician/addresses.html"
+    fragment_name = "address-row"
     extra_context = {
         # Translators: This message appears on the page title
         'title': _('Mail addresses'),
     }
 
     def get_queryset(self):
-        # retrieve mails applying filters (if any)
-        queryfilter = self.get_queryfilter()
-        addresses = self.orchestra.retrieve_mail_address_list(
-            querystring=queryfilter
-        )
+        # retrieve the page of mails (applying filters, if any) and the
+        # related resources shown on the page in a single round
+        addresses = super().get_queryset()
+        calls = {'count': addresses.count}
+        domain_id = self.request.GET.get('domain')
+        if domain_id:
+            calls['active_domain'] = partial(self.orchestra.retrieve_domain, domain_id)
+
+        self.related = self.orchestra.gather(**calls)
+        del self.related['count']
+
+        # only the number of mailboxes is retrieved (if it's used)
+        self.related['mailboxes'] = self.orchestra.retrieve_lazy_service_list(Mailbox, per_page=1)
         return addresses
 
     def get_queryfilter(self):
@@ -226,12 +289,7 @@ class MailView(ServiceListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        domain_id = self.request.GET.get('domain')
-        if domain_id:
-            context.update({
-                'active_domain': self.orchestra.retrieve_domain(domain_id)
-            })
-        context['mailboxes'] = self.orchestra.retrieve_mailbox_list()
+        context.update(self.related)
         return context
 
 
@@ -244,8 +302,10 @@ class MailCreateView(CustomContextMixin, UserTokenRequiredMixin, FormView):
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs['domains'] = self.orchestra.retrieve_domain_list()
-        kwargs['mailboxes'] = self.orchestra.retrieve_mailbox_list()
+        kwargs.update(self.orchestra.gather(
+            domain_choices=self.orchestra.retrieve_domain_choices,
+            mailbox_choices=self.orchestra.retrieve_mailbox_choices,
+        ))
         return kwargs
 
     def form_valid(self, form):
@@ -269,13 +329,11 @@ class MailUpdateView(CustomContextMixin, UserTokenRequiredMixin, FormView):
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        instance = self.orchestra.retrieve_mail_address(self.kwargs['pk'])
-
-        kwargs.update({
-            'instance': instance,
-            'domains': self.orchestra.retrieve_domain_list(),
-            'mailboxes': self.orchestra.retrieve_mailbox_list(),
-        })
+        kwargs.update(self.orchestra.gather(
+            instance=partial(self.orchestra.retrieve_mail_address, self.kwargs['pk']),
+            domain_choices=self.orchestra.retrieve_domain_choices,
+            mailbox_choices=self.orchestra.retrieve_mailbox_choices,
+        ))
 
         return kwargs
 
@@ -314,6 +372,7 @@ class AddressDeleteView(CustomContextMixin, UserTokenRequiredMixin, DeleteView):
 class MailingListsView(ServiceListView):
     service_class = MailinglistService
     template_name = "musician/mailinglists.html"
+    fragment_name = "mailinglist-row"
     extra_context = {
         # Translators: This message appears on the page title
         'title': _('Mailing lists'),
@@ -342,6 +401,7 @@ class MailingListsView(ServiceListView):
 class MailboxesView(ServiceListView):
     service_class = Mailbox
     template_name = "musician/mailboxes.html"
+    fragment_name = "mailbox-row"
     extra_context = {
         # Translators: This message appears on the page title
         'title': _('Mailboxes'),
@@ -369,7 +429,7 @@ class MailboxCreateView(CustomContextMixin, UserTokenRequiredMixin, FormView):
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs.update({
-            'addresses': self.orchestra.retrieve_mail_address_list(),
+            'address_choices': self.orchestra.retrieve_address_choices(),
         })
 
         return kwargs
@@ -400,12 +460,10 @@ class MailboxUpdateView(CustomContextMixin, UserTokenRequiredMixin, FormView):
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        instance = self.orchestra.retrieve_mailbox(self.kwargs['pk'])
-
-        kwargs.update({
-            'instance': instance,
-            'addresses': self.orchestra.retrieve_mail_address_list(),
-        })
+        kwargs.update(self.orchestra.gather(
+            instance=partial(self.orchestra.retrieve_mailbox, self.kwargs['pk']),
+            address_choices=self.orchestra.retrieve_address_choices,
+        ))
 
         return kwargs
 
@@ -449,17 +507,16 @@ class MailboxDeleteView(CustomContextMixin, UserTokenRequiredMixin, DeleteView):
         return HttpResponseRedirect(self.success_url)
 
     def notify_managers(self, mailbox):
-        user = self.get_context_data()['profile']
+        # profile was already retrieved (and cached) while verifying credentials
+        user = self.orchestra.retrieve_profile()
         subject = 'Mailbox {} ({}) deleted | Musician'.format(mailbox.id, mailbox.name)
         content = (
             "User {} ({}) has deleted its mailbox {} ({}) via musician.\n"
             "The mailbox has been marked as inactive but has not been removed."
         ).format(user.username, user.full_name, mailbox.id, mailbox.name)
 
-        try:
-            mail_managers(subject, content, fail_silently=False)
-        except (smtplib.SMTPException, ConnectionRefusedError):
-            logger.error("Error sending email to managers", exc_info=True)
+        # queued to be sent by `sendnotifications` management command
+        ManagerNotification.objects.create(subject=subject, message=content)
 
 
 class MailboxChangePasswordView(CustomContextMixin, UserTokenRequiredMixin, FormView):
@@ -506,6 +563,7 @@ class DatabasesView(ServiceListView):
 class SaasView(ServiceListView):
     service_class = SaasService
     template_name = "musician/saas.html"
+    fragment_name = "saas-card"
     extra_context = {
         # Translators: This message appears on the page title
         'title': _('Software as a Service'),
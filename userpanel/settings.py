@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 from decouple import config, Csv
 from django.contrib.messages import constants as messages
@@ -61,7 +62,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'musician.middleware.HealthCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # serve static files (collected on STATIC_ROOT) without a web server
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +73,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'musician.middleware.APIMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'userpanel.urls'
@@ -104,6 +109,22 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# It must be shared by every worker process: a write operation discards the
+# cached data of the account (on any worker) to not show outdated lists.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'musician-cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int),
+        },
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -163,6 +184,9 @@ STATIC_ROOT = config('STATIC_ROOT')
 
 API_BASE_URL = config('API_BASE_URL')
 
+# Directory to keep a local copy of bill documents (disabled if not defined)
+BILL_STORAGE_DIR = config('BILL_STORAGE_DIR', None)
+
 
 # External services URLs
 URL_DB_PHPMYADMIN = config('URL_DB_PHPMYADMIN', None)